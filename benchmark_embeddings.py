@@ -0,0 +1,69 @@
+import sys
+import time
+import argparse
+import numpy as np
+from helpers import embedding_collection
+from embedding_codec import EMBEDDING_PROJECTION, decode_embedding, encode_embedding
+from vector_index import normalize_rows
+
+def load_sample(size, seed):
+    # Only full-precision documents can serve as ground truth.
+    pipeline = [
+        {"$match": {"embedding_format": {"$in": [None, "float"]}}},
+        {"$sample": {"size": size}},
+        {"$project": EMBEDDING_PROJECTION},
+    ]
+    docs = [d for d in embedding_collection.aggregate(pipeline) if d.get("embedding")]
+    rng = np.random.default_rng(seed)
+    rng.shuffle(docs)
+    return normalize_rows([decode_embedding(d) for d in docs])
+
+def top_k(matrix, queries, k):
+    sims = queries @ matrix.T
+    return np.argpartition(-sims, k - 1, axis=1)[:, :k]
+
+def roundtrip(matrix, storage, dimensions):
+    encoded = [encode_embedding(vec, storage, dimensions) for vec in matrix]
+    size = np.mean([len(e["embedding"]) * (8 if storage == "float" else 1) for e in encoded])
+    return normalize_rows([decode_embedding(e) for e in encoded]), size
+
+def recall(truth, found):
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return hits / truth.size
+
+def run(sample, queries, k, storages, dimensions, seed):
+    start = time.time()
+    matrix = load_sample(sample, seed)
+    if len(matrix) <= k:
+        print(f"❌ Need more than {k} full-precision embeddings, found {len(matrix)}")
+        return
+    print(f"📥 Loaded {len(matrix)} embeddings ({matrix.shape[1]} dims) in {time.time() - start:.2f}s")
+
+    query_rows = matrix[:queries]
+    truth = top_k(matrix, query_rows, k)
+    for dims in dimensions:
+        for storage in storages:
+            compact, size = roundtrip(matrix, storage, dims)
+            found = top_k(compact, compact[:queries], k)
+            print(f"🎯 {storage:>7} @ {dims or matrix.shape[1]:>4} dims | {size / 1024:6.1f} KB/vector | recall@{k}: {recall(truth, found):.4f}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure top-K recall of compact embedding formats against full precision.")
+    parser.add_argument("--sample", type=int, default=20000, help="embeddings sampled as the search corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=250)
+    parser.add_argument("--storage", default="float,float16,int8", help="comma-separated formats")
+    parser.add_argument("--dimensions", default="0,1536,1024,512", help="comma-separated sizes; 0 keeps the full vector")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    run(
+        args.sample,
+        args.queries,
+        args.top_k,
+        args.storage.split(","),
+        [int(d) or None for d in args.dimensions.split(",")],
+        args.seed
+    )
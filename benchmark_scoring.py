@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+from bson import ObjectId
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pymongo.collection import Collection
+from config import (
+    TENDERS_COLLECTION,
+    PROFILES_COLLECTION,
+    SCORE_COLLECTION,
+    PARTICIPATION_STATS_COLLECTION
+)
+import helpers
+import scoring
+import rescoring
+import participation
+import keyword_match
+import vector_index
+from score_engine import DEFAULT_MIDPOINT, build_tender_table, score_profile
+from participation import participation_from_stats
+
+SCALES = {
+    "1kx10k": (1000, 10000),
+    "2kx50k": (2000, 50000),
+    "5kx100k": (5000, 100000),
+    "5kx200k": (5000, 200000),
+}
+
+BENCH_DB = "TenderBharatBench"
+BENCH_DB_PAST = "PastTendersBench"
+
+PHRASES = [
+    "road construction", "civil work", "water supply", "building repair", "electrical maintenance",
+    "bridge work", "drainage system", "solar power plant", "supply of medicines", "pipeline laying",
+    "boundary wall", "railway siding", "canal lining", "street lighting", "school building",
+]
+FILLER = [
+    "tender", "for", "the", "of", "and", "at", "district", "division", "annual", "rate", "contract",
+    "providing", "fixing", "improvement", "special", "repair", "various", "works", "zone", "block",
+]
+
+def random_point(rng):
+    return [round(rng.uniform(8.0, 35.0), 6), round(rng.uniform(68.0, 97.0), 6)]
+
+def random_text(rng, words=12):
+    parts = [rng.choice(FILLER) for _ in range(words)]
+    if rng.random() < 0.6:
+        parts.insert(rng.randrange(len(parts) + 1), rng.choice(PHRASES))
+    return " ".join(parts)
+
+def generate_tenders(n, seed=7, unique_points=400, organizations=2000, websites=40):
+    rng = random.Random(seed)
+    points = [random_point(rng) for _ in range(unique_points)]
+    orgs = [f"Organisation {i}" for i in range(organizations)]
+    sites = [f"https://portal{i}.gov.in/nicgep/app" for i in range(websites)]
+    start = datetime(2025, 1, 1)
+
+    tenders = []
+    for _ in range(n):
+        tenders.append({
+            "_id": ObjectId(),
+            "tender_value": round(10 ** rng.uniform(5, 10), 2) if rng.random() > 0.02 else None,
+            "coordinates": rng.choice(points) if rng.random() > 0.1 else [],
+            "organization": rng.choice(orgs),
+            "website": rng.choice(sites),
+            "organization_type": rng.choice(["State", "Central"]),
+            "updated_at": start + timedelta(minutes=rng.randrange(500000)),
+            "description": random_text(rng, 8),
+            "work_description": random_text(rng, 30),
+            "product_category": rng.choice(["Civil Works", "Electrical Works", "Goods", "Services"]),
+        })
+    return tenders, orgs, sites
+
+def generate_site(rng, factor):
+    return {"coordinates": random_point(rng), "factor": factor}
+
+def generate_profiles(n, seed=11):
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(n):
+        min_amt = rng.choice([0, 1000000, 5000000, 10000000])
+        profiles.append({
+            "_id": ObjectId(),
+            "user_id": str(ObjectId()),
+            "company_name": f"Company {i}",
+            "company_info": {
+                "hq_locations": [generate_site(rng, 1)],
+                "regional_offices": [generate_site(rng, 0.9) for _ in range(rng.randint(0, 3))],
+                "ongoing_sites": [generate_site(rng, 0.8) for _ in range(rng.randint(0, 5))],
+                "preferred_tender_amount_range": [min_amt, min_amt + rng.choice([50000000, 200000000, 1000000000])],
+                "keywords": rng.sample(PHRASES, rng.randint(1, 5)),
+            },
+        })
+    return profiles
+
+def generate_participation(profiles, orgs, sites, seed=13):
+    rng = random.Random(seed)
+    stats = []
+    for profile in profiles:
+        stats.append({
+            "_id": ObjectId(),
+            "name": profile["company_name"],
+            "tender_count": 0,
+            "organizations": [{"value": o, "count": rng.randint(1, 20)} for o in rng.sample(orgs, rng.randint(0, 30))],
+            "websites": [{"value": w, "count": rng.randint(1, 50)} for w in rng.sample(sites, rng.randint(0, 5))],
+        })
+    return stats
+
+def synthetic_keyword_sets(tenders):
+    keyword_sets = {kw: set() for kw in PHRASES}
+    for t in tenders:
+        text = " ".join(str(t.get(field) or "") for field in keyword_match.SEARCH_PATHS).lower()
+        for kw in PHRASES:
+            if kw in text:
+                keyword_sets[kw].add(t["_id"])
+    return keyword_sets
+
+def peak_memory_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+def report(label, pairs, elapsed):
+    rate = pairs / elapsed if elapsed else float("inf")
+    own, children = peak_memory_mb()
+    print(f"⏱ {label}: {pairs} pairs in {elapsed:.2f}s → {rate:,.0f} pairs/sec | Peak RSS: {own:.0f} MB (workers {children:.0f} MB)")
+
+def bench_scalar(profiles, tenders, max_pairs):
+    rows = [t for t in tenders if t.get("tender_value") is not None]
+    per_profile = max(1, max_pairs // max(len(profiles), 1))
+
+    for name, fn in (("score_big_tender", scoring.score_big_tender), ("score_small_tender", scoring.score_small_tender)):
+        pairs = 0
+        start = time.time()
+        for profile in profiles:
+            company_info = profile["company_info"]
+            for tender in rows[:per_profile]:
+                fn(company_info, tender, 5.0)
+                pairs += 1
+        report(name, pairs, time.time() - start)
+
+def bench_engine(profiles, tenders, stats, keyword_sets):
+    start = time.time()
+    table = build_tender_table(tenders)
+    print(f"🚀 Tender table built in {time.time() - start:.2f}s for {table['size']} tenders")
+
+    maps = {s["name"]: participation_from_stats(s) for s in stats}
+    pairs = 0
+    start = time.time()
+    for profile in profiles:
+        company_info = profile["company_info"]
+        matching = keyword_match.match_keywords(company_info.get("keywords"), keyword_sets)
+        score_profile(company_info, DEFAULT_MIDPOINT, maps.get(profile["company_name"], {}), matching, table)
+        pairs += table["size"]
+    report("score_profile (vectorized)", pairs, time.time() - start)
+
+@contextmanager
+def bound_database(client):
+    # Every Mongo handle the scoring modules imported from helpers is pointed
+    # at the benchmark databases for the duration, then put back.
+    db, db_past = client[BENCH_DB], client[BENCH_DB_PAST]
+    replacements = {id(helpers.db): db, id(helpers.db_past): db_past}
+    for name, handle in vars(helpers).items():
+        if isinstance(handle, Collection):
+            target = db_past if handle.database is helpers.db_past else db
+            replacements[id(handle)] = target[handle.name]
+
+    # The synthetic stats have no Competitors behind them; a refresh would
+    # drop them as orphans.
+    patches = [(scoring, "refresh_participation_stats", lambda names=None: None)]
+    for module in (scoring, rescoring, participation, keyword_match, vector_index):
+        for name, value in vars(module).items():
+            if id(value) in replacements:
+                patches.append((module, name, replacements[id(value)]))
+
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield db, db_past
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+
+def bench_submit(client, profiles, tenders, stats, args):
+    with bound_database(client) as (db, db_past):
+        client.drop_database(BENCH_DB)
+        client.drop_database(BENCH_DB_PAST)
+
+        db[TENDERS_COLLECTION].insert_many([dict(t) for t in tenders], ordered=False)
+        db[PROFILES_COLLECTION].insert_many([dict(p) for p in profiles], ordered=False)
+        db_past[PARTICIPATION_STATS_COLLECTION].insert_many([dict(s) for s in stats], ordered=False)
+
+        pairs = len(profiles) * sum(1 for t in tenders if t.get("tender_value") is not None)
+        start = time.time()
+        scoring.submit_for_scoring(
+            mode=args.mode,
+            storage=args.storage,
+            workers=args.workers,
+            writers=args.writers,
+            keyword_backend="local",
+            # Forked workers open their own client; mongomock lives in this process only.
+            mongo_uri=None if args.mock else args.mongo_uri
+        )
+        report(f"submit_for_scoring ({args.mode}/{args.storage})", pairs, time.time() - start)
+        print(f"📦 Stored scores: {db[SCORE_COLLECTION].estimated_document_count()}")
+
+        if not args.keep:
+            client.drop_database(BENCH_DB)
+            client.drop_database(BENCH_DB_PAST)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark tender scoring on synthetic profiles and tenders.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1kx10k")
+    parser.add_argument("--profiles", type=int, help="override the profile count of --scale")
+    parser.add_argument("--tenders", type=int, help="override the tender count of --scale")
+    parser.add_argument("--scalar-pairs", type=int, default=200000, help="pairs timed through the scalar functions")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017", help="local mongod used for submit_for_scoring")
+    parser.add_argument("--mock", action="store_true", help="use mongomock instead of a local mongod")
+    parser.add_argument("--skip-submit", action="store_true", help="only time the scoring functions")
+    parser.add_argument("--mode", default="full", choices=["full", "incremental", "shadow"])
+    parser.add_argument("--storage", default="dense", choices=["dense", "topk"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark databases afterwards")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    n_profiles, n_tenders = SCALES[args.scale]
+    n_profiles = args.profiles or n_profiles
+    n_tenders = args.tenders or n_tenders
+
+    # Keyword caches are written relative to the working directory; keep the
+    # synthetic ones away from the production cache files.
+    os.chdir(tempfile.mkdtemp(prefix="scoring-bench-"))
+
+    print(f"🧪 Generating {n_profiles} profiles × {n_tenders} tenders...")
+    tenders, orgs, sites = generate_tenders(n_tenders)
+    profiles = generate_profiles(n_profiles)
+    stats = generate_participation(profiles, orgs, sites)
+
+    bench_scalar(profiles, tenders, args.scalar_pairs)
+
+    keyword_sets = synthetic_keyword_sets(tenders)
+    bench_engine(profiles, tenders, stats, keyword_sets)
+
+    if args.skip_submit:
+        return
+
+    if args.mock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+    bench_submit(client, profiles, tenders, stats, args)
+
+if __name__ == "__main__":
+    main()
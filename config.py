@@ -5,6 +5,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 JSONL_FILE = "/home/ubuntu/BidScraper/TenderData/Tenders/08_Dec_2025/tender.jsonl"
+INGEST_MANIFEST_DIR = "cache/ingest"     # parsed/enriched JSONL shared by preprocessing and upsertion
+INGEST_WORKERS = 8                       # processes parsing JSONL chunks; 1 parses in the main process
+INGEST_CHUNK_BYTES = 64 * 1024 * 1024
+INGEST_ORDERED = True                    # keep manifest records in file order; False writes chunks as they finish
+DATE_CACHE_SIZE = 65536                  # distinct date strings memoized per process
+UPSERT_WRITERS = 4                       # bulk writes in flight while the manifest keeps streaming
+UPSERT_CHECKPOINT_FILE = "cache/upsert_checkpoint.json"
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -16,9 +23,28 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 VECTOR_INDEX_NAME = "tenders_vector_index"
 MODEL = "text-embedding-3-large"
 BATCH_SIZE_EMBEDDINGS = 512             
+EMBEDDING_DIMENSIONS = None              # e.g. 1024 to request shorter vectors (Atlas index numDimensions must match)
+EMBEDDING_STORAGE = "float"             # "float16" or "int8" store packed BinData; those need VECTOR_SEARCH_BACKEND = "local"
 MAX_RETRIES = 8
 WORKERS = 4            
+EMBEDDING_MAX_BATCH_TOKENS = 250000      # estimated tokens per request (API limit is 300k)
+EMBEDDING_TPM = 1000000                   # tokens/minute for the embedding model on this account
+EMBEDDING_RPM = 3000
+EMBEDDING_MAX_CONCURRENCY = 16            # upper bound; halves on 429s and recovers on success
+EMBEDDING_QUEUE_SIZE = 32                 # batches buffered between pipeline stages
+EMBEDDING_CHECKPOINT_FILE = "cache/embedding_checkpoint.json"
 TOP_K = 250
+EMBEDDING_PREFETCH_BATCH = 500
+VECTOR_SEARCH_BACKEND = "atlas"         # "atlas" uses $vectorSearch, "local" uses the memory-mapped exact index
+VECTOR_INDEX_DIR = "cache/vector_index"
+VECTOR_INDEX_DTYPE = "float32"          # or "float16" to halve the index on disk and in RAM
+VECTOR_INDEX_CHUNK_ROWS = 16384
+VECTOR_QUERY_BATCH = 64
+RESCORE_QUERY_MODE = "per_tender"       # "clustered" searches once per group of similar saved tenders per user, re-ranking candidates from the local index or, with "atlas", from TenderEmbeddings
+QUERY_CLUSTER_THRESHOLD = 0.85          # cosine similarity for a saved tender to join a group
+QUERY_CLUSTER_LIMIT_FACTOR = 4          # group searches fetch TOP_K * min(group size, factor) candidates
+VECTOR_SEARCH_CONCURRENCY = 8          # parallel vector searches in rescore; 1 runs them one at a time
+VECTOR_SEARCH_CACHE_FILE = None         # e.g. "cache/vector_search.pkl" to reuse searches across runs until TenderEmbeddings changes
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -31,17 +57,35 @@ DB_NAME = "TenderBharat"
 DB_NAME_PAST = "PastTenders"
 TENDERS_COLLECTION = "Tenders"
 EMBEDDINGS_COLLECTION = "TenderEmbeddings"
+EMBEDDING_CACHE_COLLECTION = "EmbeddingCache"
 VECTOR_COLLECTION = "TenderDocs"
 DOCS_STATUS_COLLECTION = "TendersDocsStatus"
 RESULTS_COLLECTION = "Results"
 COMPETITORS_COLLECTION = "Competitors"
+PARTICIPATION_STATS_COLLECTION = "ParticipationStats"
 PROFILES_COLLECTION = "profiles"
 SCORE_COLLECTION = "CompatibilityScores"
+SCORE_STAGING_COLLECTION = "CompatibilityScores_staging"
+SCORE_THRESHOLDS_COLLECTION = "CompatibilityThresholds"
+SCORING_STATE_COLLECTION = "ScoringState"
 NOTIFICATIONS_COLLECTION = "Notification"
 
 BATCH_SIZE = 5000
 NUM_WORKERS_DEEPSEEK = 50
 NUM_WORKERS_OLA = 1
+SCORING_MODE = "full"                   # "full" rebuilds every score, "incremental" only rescores what changed, "shadow" rebuilds into staging and swaps
+SHADOW_BATCH_SIZE = 20000
+SCORING_WORKERS = 16                    # scoring processes; 1 scores profiles in the main process
+SCORING_WRITERS = 4                     # bulk-write threads; 1 writes inline
+SCORE_STORAGE = "dense"                 # "dense" stores every pair, "topk" keeps only each user's best tenders per value band
+SCORE_TOP_K_LOW = 50
+SCORE_TOP_K_HIGH = 10
+SCORE_TOP_K_MARGIN = 10.0               # the largest rescore boost, so every tender a boost could lift into the top K is kept
+KEYWORD_MATCH_BACKEND = "atlas"         # "atlas" queries the TenderSearch index, "local" uses an in-process inverted index
+KEYWORD_SEARCH_WORKERS = 8
+KEYWORD_SEARCH_RETRIES = 3             # attempts per keyword before scoring is aborted
+KEYWORD_CACHE_FILE = "cache/keyword_matches.pkl"
+LOCAL_KEYWORD_INDEX_FILE = "cache/keyword_index.pkl"
 
 CENTRAL_URLS = [
     "https://eprocure.gov.in/eprocure/app",
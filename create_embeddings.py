@@ -1,25 +1,70 @@
+import os
+import json
 import time
+import queue
+import hashlib
+import threading
 import openai
 import pymongo
 from tqdm import tqdm
 from bson import ObjectId
+from datetime import datetime
 from pymongo import UpdateOne
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from helpers import collection, embedding_collection
-from config import MODEL, WORKERS, MAX_RETRIES, BATCH_SIZE_EMBEDDINGS, OPENAI_API_KEY
+from helpers import collection, embedding_collection, embedding_cache_collection
+from config import (
+    MODEL,
+    WORKERS,
+    MAX_RETRIES,
+    BATCH_SIZE_EMBEDDINGS,
+    OPENAI_API_KEY,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_STORAGE,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_TPM,
+    EMBEDDING_RPM,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_QUEUE_SIZE,
+    EMBEDDING_CHECKPOINT_FILE,
+    EMBEDDINGS_COLLECTION
+)
+from embedding_codec import EMBEDDING_PROJECTION, encode_embedding, check_storage_backend, is_current_format
+from rate_limit import new_rate_limiter, acquire, release
 
 openai.api_key = OPENAI_API_KEY
 
-def embed_batch(texts):
+def estimate_tokens(text):
+    # ~4 characters per token for English; count 3 so batches stay under the
+    # request limit for denser text.
+    return len(text) // 3 + 1
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def embed_batch(texts, limiter):
+    estimated = sum(estimate_tokens(t) for t in texts)
     for attempt in range(MAX_RETRIES):
+        acquire(limiter, estimated)
         try:
+            params = {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {}
             res = openai.embeddings.create(
                 model=MODEL,
-                input=texts
+                input=texts,
+                **params
             )
+            usage = getattr(res, "usage", None)
+            release(limiter, estimated, getattr(usage, "total_tokens", None))
             return [d.embedding for d in res.data]
 
         except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                release(limiter, throttled=True, retry_after=retry_after_seconds(e))
+                continue
+            release(limiter)
             wait = 2 ** attempt
             print(f"⚠️ Error: {e} | retrying in {wait:.1f}s")
             time.sleep(wait)
@@ -27,62 +72,229 @@ def embed_batch(texts):
     print("❌ Max retries reached for batch")
     return None
 
-def process_batch(col_src, col_emb, batch_docs):
+def token_batches(docs, max_tokens=EMBEDDING_MAX_BATCH_TOKENS, max_inputs=BATCH_SIZE_EMBEDDINGS):
+    batch, batch_tokens = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.get("description") or "")
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(doc)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+EMBEDDING_FIELDS = ("embedding", "embedding_format", "embedding_dims", "embedding_scale")
+
+def text_key(text):
+    # Content address of the exact text sent to the API (embeddings are case
+    # and whitespace sensitive) under the model and storage settings.
+    raw = f"{MODEL}|{EMBEDDING_DIMENSIONS}|{EMBEDDING_STORAGE}|{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def cached_embeddings(keys):
+    # EmbeddingCache only maps a text key to a tender whose TenderEmbeddings
+    # document holds that vector. The document must still carry the same
+    # text_key and current format; a tender that was removed, re-embedded for
+    # new text or migrated since is a miss.
+    refs = {
+        doc["_id"]: doc["tender_id"]
+        for doc in embedding_cache_collection.find({"_id": {"$in": list(keys)}, "tender_id": {"$exists": True}})
+    }
+    if not refs:
+        return {}
+    cursor = embedding_collection.find(
+        {"tender_id": {"$in": list(set(refs.values()))}},
+        dict(EMBEDDING_PROJECTION, embedding_dims=1, text_key=1)
+    )
+    docs = {doc["text_key"]: doc for doc in cursor if doc.get("text_key") in refs}
+
+    fields_by_key = {}
+    for key, doc in docs.items():
+        if doc["tender_id"] == refs[key] and doc.get("embedding") is not None and is_current_format(doc):
+            fields_by_key[key] = {f: doc[f] for f in EMBEDDING_FIELDS if f in doc}
+    return fields_by_key
+
+def store_cached_embeddings(refs):
+    if not refs:
+        return
+    # Only the write stage calls this, so upserts on one key never race.
+    embedding_cache_collection.bulk_write([
+        UpdateOne({"_id": k}, {"$set": {"tender_id": tender_id}}, upsert=True)
+        for k, tender_id in refs.items()
+    ], ordered=False)
+
+def embed_docs(batch_docs, limiter):
     texts = [(d.get("description") or "") for d in batch_docs]
     ids = [str(d["_id"]) for d in batch_docs]  
+    keys = [text_key(t) for t in texts]
 
-    vectors = embed_batch(texts)
-    if vectors is None:
-        return 0
+    unique = {}
+    for key, text in zip(keys, texts):
+        unique.setdefault(key, text)
+    fields_by_key = cached_embeddings(unique)
+    missing = [k for k in unique if k not in fields_by_key]
+
+    new_refs = {}
+    if missing:
+        vectors = embed_batch([unique[k] for k in missing], limiter)
+        if vectors is None:
+            return None
+        fields_by_key.update({k: encode_embedding(vec) for k, vec in zip(missing, vectors)})
+        # Referenced only once the writer has stored the tender's vector.
+        new_refs = {k: ids[keys.index(k)] for k in missing}
 
     ops = []
-    for tender_id, vec in zip(ids, vectors):
+    for tender_id, key in zip(ids, keys):
         ops.append(
             UpdateOne(
                 {"tender_id": tender_id},
-                {"$set": {"tender_id": tender_id, "embedding": vec}},
+                {"$set": {"tender_id": tender_id, **fields_by_key[key], "text_key": key, "embedded_at": datetime.now()}},
                 upsert=True
             )
         )
 
-    col_emb.bulk_write(ops)
-    return len(ops)
+    return {"ops": ops, "sent": len(missing), "cache": new_refs}
 
-def create_embeddings():
-    print("🔍 Fetching docs missing embeddings...")
+def load_checkpoint(path=EMBEDDING_CHECKPOINT_FILE):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    existing = set(
-        d["tender_id"]
-        for d in embedding_collection.find({}, {"tender_id": 1})
-    )
+def save_checkpoint(state, path=EMBEDDING_CHECKPOINT_FILE):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
-    docs = list(
-        collection.find(
-            {"_id": {"$nin": [ObjectId(x) for x in existing]}},
-            {"_id": 1, "description": 1}
-        )
-    )
+def clear_checkpoint(path=EMBEDDING_CHECKPOINT_FILE):
+    if path and os.path.exists(path):
+        os.remove(path)
 
-    total = len(docs)
-    if total == 0:
-        print("✔ All embeddings already exist")
-        return
+def missing_embedding_pipeline(after_id=None):
+    # Anti-join on the server: only tenders without a TenderEmbeddings
+    # document come back, instead of shipping every embedded ID in a $nin.
+    # Walking _id order lets a checkpoint skip ranges already handled.
+    # $lookup with both localField and a pipeline needs MongoDB 5.0+.
+    match = [{"$match": {"_id": {"$gt": after_id}}}] if after_id else []
+    return match + [
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 1, "description": 1, "tender_id": {"$toString": "$_id"}}},
+        {"$lookup": {
+            "from": EMBEDDINGS_COLLECTION,
+            "localField": "tender_id",
+            "foreignField": "tender_id",
+            "pipeline": [{"$project": {"_id": 1}}, {"$limit": 1}],
+            "as": "embedded"
+        }},
+        {"$match": {"embedded": {"$size": 0}}},
+        {"$project": {"_id": 1, "description": 1}}
+    ]
+
+def create_embeddings(workers=None):
+    # Streaming pipeline: the cursor feeds token-packed batches into a bounded
+    # queue, embed workers call the API, and one writer thread stores results
+    # and advances the checkpoint. Memory holds at most a few queues of batches.
+    check_storage_backend()
+    workers = workers or max(WORKERS, EMBEDDING_MAX_CONCURRENCY)
+    checkpoint = load_checkpoint()
+    after_id = ObjectId(checkpoint["last_id"]) if checkpoint else None
+    if after_id:
+        print(f"⏩ Resuming after {after_id} ({checkpoint['written']} tenders written before the interruption)")
 
-    print(f"🔵 Need embeddings for {total} docs")
+    # The anti-join probes TenderEmbeddings by tender_id once per tender;
+    # without this index every probe is a collection scan.
+    embedding_collection.create_index([("tender_id", 1)])
+    # Entries from before the cache held references carry a whole vector.
+    embedding_cache_collection.delete_many({"tender_id": {"$exists": False}})
+    print("🔍 Streaming docs missing embeddings...")
+    cursor = collection.aggregate(missing_embedding_pipeline(after_id), allowDiskUse=True, batchSize=BATCH_SIZE_EMBEDDINGS)
+    limiter = new_rate_limiter(EMBEDDING_TPM, EMBEDDING_RPM, EMBEDDING_MAX_CONCURRENCY)
+    work_queue = queue.Queue(maxsize=EMBEDDING_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=EMBEDDING_QUEUE_SIZE)
+    written_before = checkpoint["written"] if checkpoint else 0
+    stats = {"written": 0, "sent": 0, "failed": 0}
+    pbar = tqdm(desc="Embedding")
 
-    batches = [docs[i:i + BATCH_SIZE_EMBEDDINGS] for i in range(0, total, BATCH_SIZE_EMBEDDINGS)]
+    def embed_worker():
+        while (item := work_queue.get()) is not None:
+            seq, batch = item
+            try:
+                result = embed_docs(batch, limiter)
+            except Exception as e:
+                print(f"⚠️ Error embedding batch {seq}: {e}")
+                result = None
+            write_queue.put((seq, batch, result))
 
-    pbar = tqdm(total=total, desc="Embedding")
+    def write_stage():
+        # Batches finish out of order; the checkpoint only moves past a batch
+        # once it and every batch before it are stored, and stops at the
+        # first failure so a resumed run goes back for it.
+        finished, next_seq, stalled = {}, 0, False
+        while (item := write_queue.get()) is not None:
+            if "error" in stats:
+                continue
+            try:
+                seq, batch, result = item
+                if result is not None:
+                    try:
+                        embedding_collection.bulk_write(result["ops"])
+                        store_cached_embeddings(result["cache"])
+                        stats["written"] += len(batch)
+                        stats["sent"] += result["sent"]
+                    except Exception as e:
+                        print(f"⚠️ Error writing batch {seq}: {e}")
+                        result = None
+                if result is None:
+                    stats["failed"] += len(batch)
+                finished[seq] = (result is not None, batch[-1]["_id"])
+                pbar.update(len(batch))
 
-    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-        futures = {
-            executor.submit(process_batch, collection, embedding_collection, batch): batch
-            for batch in batches
-        }
+                last_id = None
+                while next_seq in finished:
+                    ok, batch_last_id = finished.pop(next_seq)
+                    stalled = stalled or not ok
+                    if not stalled:
+                        last_id = batch_last_id
+                    next_seq += 1
+                if last_id is not None:
+                    save_checkpoint({"last_id": str(last_id), "written": written_before + stats["written"], "updated_at": datetime.now().isoformat()})
+            except Exception as e:
+                # Keep draining so the embed workers and the producer never
+                # block on a full queue; create_embeddings re-raises it.
+                print(f"❌ Writer stage stopped: {e}")
+                stats["error"] = e
 
-        for future in as_completed(futures):
-            done = future.result()
-            pbar.update(done)
+    threads = [threading.Thread(target=embed_worker, daemon=True) for _ in range(workers)]
+    writer = threading.Thread(target=write_stage, daemon=True)
+    for t in threads + [writer]:
+        t.start()
 
+    start = time.time()
+    for seq, batch in enumerate(token_batches(cursor)):
+        if "error" in stats:
+            break
+        work_queue.put((seq, batch))
+    for _ in threads:
+        work_queue.put(None)
+    for t in threads:
+        t.join()
+    write_queue.put(None)
+    writer.join()
     pbar.close()
+    if "error" in stats:
+        raise stats["error"]
+
+    if stats["failed"]:
+        print(f"❌ {stats['failed']} tenders failed to embed — checkpoint kept; rerun to retry them.")
+    else:
+        clear_checkpoint()
+
+    print(f"⏱ Embedding pipeline: {stats['written']} tenders stored in {time.time() - start:.2f}s")
+    print(f"🚦 Rate limiter: {limiter['throttles']} throttles | final concurrency {limiter['limit']}/{limiter['max_limit']}")
+    print(f"🧠 Embedded {stats['sent']} unique texts via the API | the rest reused cached embeddings")
     print("🎉 DONE — All embeddings stored in TenderEmbeddings with stringified tender_id!")
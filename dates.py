@@ -0,0 +1,96 @@
+import re
+from datetime import datetime
+from collections import Counter
+from functools import lru_cache
+from dateutil import parser
+from config import DATE_CACHE_SIZE
+
+# NIC portals write "08-Dec-2025 10:30 AM"; corrigenda and the scraper's own
+# timestamps are ISO. Anything else still goes through strptime/dateutil.
+MONTHS = {m: i for i, m in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+NIC_PATTERN = re.compile(r"(\d{1,2})-([A-Za-z]{3})-(\d{4})(?:\s+(\d{1,2}):(\d{2})\s+([AaPp][Mm]))?")
+ISO_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{3}|\.\d{6})?)?)?)(?:Z|[+-]\d{2}:?\d{2})?")
+
+_stats = Counter()
+
+def _nic_fast_path(date_str):
+    match = NIC_PATTERN.fullmatch(date_str)
+    if not match:
+        return None
+    day, month, year, hour, minute, meridiem = match.groups()
+    month = MONTHS.get(month.lower())
+    if month is None:
+        return None
+    if hour is None:
+        return datetime(int(year), month, int(day))
+    hour = int(hour)
+    if not 1 <= hour <= 12:
+        return None
+    hour = hour % 12 + (12 if meridiem.lower() == "pm" else 0)
+    return datetime(int(year), month, int(day), hour, int(minute))
+
+def _iso_fast_path(date_str):
+    match = ISO_PATTERN.fullmatch(date_str)
+    if not match:
+        return None
+    # Like the dateutil path, an offset is dropped rather than applied.
+    return datetime.fromisoformat(match.group(1))
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse(date_str):
+    for path, fast_path in (("nic", _nic_fast_path), ("iso", _iso_fast_path)):
+        try:
+            dt = fast_path(date_str)
+        except ValueError:
+            dt = None
+        if dt is not None:
+            _stats[path] += 1
+            return dt
+
+    try:
+        dt = datetime.strptime(date_str, "%d-%b-%Y %I:%M %p")
+        _stats["strptime"] += 1
+        return dt
+    except ValueError:
+        pass
+
+    try:
+        dt = parser.parse(date_str).replace(tzinfo=None)
+        _stats["dateutil"] += 1
+        return dt
+    except (ValueError, OverflowError, TypeError):
+        _stats["failed"] += 1
+        return None
+
+def parse_date(date_str):
+    if not date_str or str(date_str).strip() == "":
+        _stats["empty"] += 1
+        return None
+    if not isinstance(date_str, str):
+        _stats["failed"] += 1
+        return None
+    return _parse(date_str)
+
+def parse_dates(values):
+    return [parse_date(v) for v in values]
+
+def date_parse_stats():
+    stats = dict(_stats)
+    stats["cache_hits"] = _parse.cache_info().hits
+    return stats
+
+def merge_date_stats(total, stats):
+    for key, count in stats.items():
+        total[key] = total.get(key, 0) + count
+    return total
+
+def diff_date_stats(after, before):
+    return {key: count - before.get(key, 0) for key, count in after.items() if count - before.get(key, 0)}
+
+def report_date_stats(stats):
+    parsed = sum(stats.get(k, 0) for k in ("nic", "iso", "strptime", "dateutil", "failed"))
+    print(
+        f"📅 Dates: {parsed} parsed + {stats.get('cache_hits', 0)} cached | "
+        f"NIC {stats.get('nic', 0)} | ISO {stats.get('iso', 0)} | strptime {stats.get('strptime', 0)} | "
+        f"dateutil {stats.get('dateutil', 0)} | failed {stats.get('failed', 0)} | empty {stats.get('empty', 0)}"
+    )
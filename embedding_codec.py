@@ -0,0 +1,58 @@
+import numpy as np
+from bson import Binary
+from config import EMBEDDING_STORAGE, EMBEDDING_DIMENSIONS, VECTOR_SEARCH_BACKEND
+
+PACKED_DTYPES = {"float16": np.float16, "int8": np.int8}
+EMBEDDING_PROJECTION = {"tender_id": 1, "embedding": 1, "embedding_format": 1, "embedding_scale": 1}
+
+def check_storage_backend(storage=EMBEDDING_STORAGE, backend=VECTOR_SEARCH_BACKEND):
+    # $vectorSearch only indexes numeric arrays; packed BinData documents
+    # would silently drop out of Atlas results.
+    if storage != "float" and backend != "local":
+        raise ValueError(f"Embedding storage {storage!r} is not searchable by Atlas; set VECTOR_SEARCH_BACKEND = 'local' (got {backend!r})")
+
+def reduce_dimensions(vec, dimensions=EMBEDDING_DIMENSIONS):
+    # text-embedding-3 vectors can be shortened by truncating and
+    # re-normalizing, which is what the API's `dimensions` parameter does.
+    vec = np.asarray(vec, dtype=np.float32)
+    if dimensions and len(vec) > dimensions:
+        vec = vec[:dimensions]
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+def encode_embedding(vec, storage=EMBEDDING_STORAGE, dimensions=EMBEDDING_DIMENSIONS):
+    vec = reduce_dimensions(vec, dimensions)
+    if storage == "float":
+        return {"embedding": vec.tolist(), "embedding_format": "float", "embedding_dims": len(vec)}
+
+    if storage == "int8":
+        scale = float(np.abs(vec).max()) / 127 or 1.0
+        packed = np.round(vec / scale).astype(np.int8)
+    elif storage == "float16":
+        scale = None
+        packed = vec.astype(np.float16)
+    else:
+        raise ValueError(f"Unknown embedding storage: {storage}")
+
+    return {
+        "embedding": Binary(packed.tobytes()),
+        "embedding_format": storage,
+        "embedding_dims": len(vec),
+        "embedding_scale": scale,
+    }
+
+def decode_embedding(doc):
+    vec = doc.get("embedding")
+    fmt = doc.get("embedding_format", "float")
+    if vec is None or fmt == "float":
+        return vec
+    values = np.frombuffer(bytes(vec), dtype=PACKED_DTYPES[fmt]).astype(np.float32)
+    if fmt == "int8":
+        values *= doc.get("embedding_scale") or 1.0
+    return values.tolist()
+
+def is_current_format(doc, storage=EMBEDDING_STORAGE, dimensions=EMBEDDING_DIMENSIONS):
+    if doc.get("embedding_format", "float") != storage:
+        return False
+    dims = doc.get("embedding_dims") or len(doc.get("embedding") or [])
+    return not dimensions or dims <= dimensions
@@ -1,13 +1,13 @@
+import os
 import re
 import json
+import pickle
 import time
 import uuid
 import math
 import boto3
 import certifi
 import requests
-from dateutil import parser
-from datetime import datetime
 from pymongo import MongoClient
 from config import (
     AWS_ACCESS_KEY_ID,
@@ -18,12 +18,17 @@ from config import (
     DB_NAME_PAST,
     TENDERS_COLLECTION,
     EMBEDDINGS_COLLECTION,
+    EMBEDDING_CACHE_COLLECTION,
     DOCS_STATUS_COLLECTION,
     VECTOR_COLLECTION,
     RESULTS_COLLECTION,
     COMPETITORS_COLLECTION,
+    PARTICIPATION_STATS_COLLECTION,
     PROFILES_COLLECTION,
     SCORE_COLLECTION,
+    SCORE_STAGING_COLLECTION,
+    SCORE_THRESHOLDS_COLLECTION,
+    SCORING_STATE_COLLECTION,
     NOTIFICATIONS_COLLECTION,
     DEEPSEEK_API_URL,
     DEEPSEEK_API_KEY,
@@ -38,32 +43,30 @@ s3 = boto3.client(
     region_name=AWS_REGION,
 )
 
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+def connect(uri=MONGO_URI):
+    # Atlas needs certifi's CA bundle; a plain local mongod has no TLS.
+    if uri == MONGO_URI:
+        return MongoClient(uri, tlsCAFile=certifi.where())
+    return MongoClient(uri)
+
+client = connect()
 db = client[DB_NAME]
 db_past = client[DB_NAME_PAST]
 collection = db[TENDERS_COLLECTION]
 embedding_collection = db[EMBEDDINGS_COLLECTION]
+embedding_cache_collection = db[EMBEDDING_CACHE_COLLECTION]
 status_collection = db[DOCS_STATUS_COLLECTION]
 vector_collection = db[VECTOR_COLLECTION]
 result_collection = db_past[RESULTS_COLLECTION]
 competitor_collection = db_past[COMPETITORS_COLLECTION]
+participation_stats_collection = db_past[PARTICIPATION_STATS_COLLECTION]
 profile_collection = db[PROFILES_COLLECTION]
 score_collection = db[SCORE_COLLECTION]
+score_staging_collection = db[SCORE_STAGING_COLLECTION]
+score_threshold_collection = db[SCORE_THRESHOLDS_COLLECTION]
+scoring_state_collection = db[SCORING_STATE_COLLECTION]
 notification_collection = db[NOTIFICATIONS_COLLECTION]
 
-def parse_date_naive(date_str):
-    if not date_str or str(date_str).strip() == "":
-        return None
-    try:
-        dt = datetime.strptime(date_str, "%d-%b-%Y %I:%M %p")
-        return dt
-    except:
-        try:
-            dt = parser.parse(date_str)
-            return dt.replace(tzinfo=None)
-        except:
-            return None
-
 def query_deepseek(prompt, MODEL_NAME="deepseek-chat", retries=2, backoff=2):
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {DEEPSEEK_API_KEY}"}
     payload = {
@@ -125,3 +128,26 @@ def haversine(coord1, coord2):
     dlon = math.radians(lon2 - lon1)
     a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
     return R * (2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+
+def load_pickle_cache(cache_file, watermark):
+    if not cache_file or not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as f:
+            cached = pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read cache {cache_file}: {e}")
+        return None
+    if not isinstance(cached, dict) or cached.get("watermark") != watermark:
+        print(f"♻️ Cache {cache_file} is stale — ignoring it.")
+        return None
+    return cached.get("data")
+
+def save_pickle_cache(cache_file, watermark, data):
+    if not cache_file:
+        return
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump({"watermark": watermark, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
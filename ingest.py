@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import pickle
+import uuid
+import hashlib
+import multiprocessing as mp
+from tqdm import tqdm
+from config import STATE_URLS, JSONL_FILE, INGEST_MANIFEST_DIR, INGEST_WORKERS, INGEST_CHUNK_BYTES, INGEST_ORDERED
+from helpers import load_pickle_cache, save_pickle_cache
+from dates import parse_date, parse_dates, date_parse_stats, diff_date_stats, merge_date_stats, report_date_stats
+
+MANIFEST_VERSION = 3                     # bump when the stored record layout or content_hash changes
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+def enrich_tender_data(tender):
+    work_item = tender.get("WorkItemDetails", {})
+    basic_details = tender.get("BasicDetails", {})
+    emd_details = tender.get("EmdFeeDetails", {})
+    critical_dates = tender.get("CriticalDates", {})
+    corrigendums = tender.get("Corrigenda") or []
+
+    website = (tender.get("Website") or "").lower()
+    organization_type = "Central"
+    state_name = ""
+
+    for state, url in STATE_URLS.items():
+        if url.lower() in website:
+            organization_type = "State"
+            state_name = state
+            break
+
+    corrigendum_dates = parse_dates([d.get("PublishedDate", "") for c in corrigendums for d in c.get("Details") or []])
+    latest_corrigendum_date = max([dt for dt in corrigendum_dates if dt], default=None)
+
+    def safe_float(val):
+        try:
+            return round(float(val or 0), 2)
+        except:
+            return 0.0
+
+    enriched = {
+        "unique_identifier": tender.get("UniqueIdentifier", ""),
+        "updated_at": parse_date(tender.get("UpdatedAt", "")),
+        "website": tender.get("Website", ""),
+        "link": tender.get("Link", ""),
+        "description": work_item.get("Title", ""),
+        "work_description": work_item.get("Description", ""),
+        "tender_value": safe_float(work_item.get("TenderValue", 0)),
+        "emd": safe_float(emd_details.get("EmdAmount", 0)),
+        "published_date": parse_date(critical_dates.get("PublishedDate", "")),
+        "corrigendum_date": latest_corrigendum_date,
+        "submission_date": parse_date(critical_dates.get("BidSubmissionEndDate", "")),
+        "organization": basic_details.get("OrganisationChain", "").split("||")[0],
+        "organization_type": organization_type,
+        "state": state_name,
+        "organization_tender_id": basic_details.get("TenderID", ""),
+        "type": basic_details.get("FormOfContract", ""),
+        "category": basic_details.get("TenderCategory", ""),
+        "product_category": work_item.get("ProductCategory", ""),
+        "product_sub_category": work_item.get("SubCategory", ""),
+        "completion_period": safe_float(work_item.get("PeriodOfWorkDays", 0)),
+        "corrigendums": corrigendums
+    }
+
+    return enriched
+
+# Rewritten by the scraper on every crawl whether or not the tender changed.
+VOLATILE_FIELDS = ("updated_at",)
+
+def content_hash(enriched):
+    # Stable across runs: keys sorted, dates and other non-JSON values as str.
+    content = {k: v for k, v in enriched.items() if k not in VOLATILE_FIELDS}
+    payload = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def most_recent_date(enriched):
+    return max([d for d in [enriched["published_date"], enriched["corrigendum_date"]] if d is not None], default=None)
+
+def source_signature(jsonl_file):
+    stat = os.stat(jsonl_file)
+    return (os.path.abspath(jsonl_file), stat.st_size, stat.st_mtime_ns, MANIFEST_VERSION)
+
+def manifest_paths(jsonl_file, manifest_dir=INGEST_MANIFEST_DIR):
+    name = os.path.basename(os.path.dirname(os.path.abspath(jsonl_file))) or "tenders"
+    return os.path.join(manifest_dir, f"{name}.index.pkl"), os.path.join(manifest_dir, f"{name}.records.pkl")
+
+def remove_stale_manifests(jsonl_file, manifest_dir=INGEST_MANIFEST_DIR):
+    # Each daily scraper directory gets its own manifest pair, several GB
+    # apiece; only the one being built is ever read again.
+    keep = {os.path.basename(p) for p in manifest_paths(jsonl_file, manifest_dir)}
+    removed = 0
+    for name in os.listdir(manifest_dir):
+        if name in keep or not name.endswith((".index.pkl", ".records.pkl", ".records.pkl.tmp")):
+            continue
+        path = os.path.join(manifest_dir, name)
+        removed += os.path.getsize(path)
+        os.remove(path)
+    if removed:
+        print(f"🧹 Removed old ingest manifests ({removed / 1e6:.1f} MB)")
+
+def chunk_ranges(jsonl_file, chunk_bytes=INGEST_CHUNK_BYTES):
+    # Byte ranges of roughly chunk_bytes, each pushed forward to the next
+    # newline so no line is split between two workers.
+    size = os.path.getsize(jsonl_file)
+    offsets = [0]
+    with open(jsonl_file, "rb") as f:
+        while offsets[-1] < size:
+            f.seek(min(offsets[-1] + chunk_bytes, size))
+            f.readline()
+            offsets.append(f.tell())
+    return [(jsonl_file, start, end) for start, end in zip(offsets, offsets[1:])]
+
+def parse_chunk(task):
+    jsonl_file, start, end = task
+    dates_before = date_parse_stats()
+    with open(jsonl_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    lines = data.split(b"\n")
+    if data.endswith(b"\n"):
+        lines.pop()
+
+    # Records go back already pickled so the parent only appends bytes.
+    parts, unique_ids, freshness, errors = [], [], [], []
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            tender = json_loads(line)
+        except ValueError as e:
+            errors.append((i, str(e)))
+            continue
+
+        enriched = enrich_tender_data(tender)
+        enriched["content_hash"] = content_hash(enriched)
+        if enriched["unique_identifier"]:
+            unique_ids.append(enriched["unique_identifier"])
+        freshness.append((enriched["unique_identifier"], most_recent_date(enriched)))
+        parts.append(pickle.dumps(enriched, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return {
+        "start": start,
+        "lines": len(lines),
+        "records": b"".join(parts),
+        "count": len(parts),
+        "unique_ids": unique_ids,
+        "freshness": freshness,
+        "errors": errors,
+        "date_stats": diff_date_stats(date_parse_stats(), dates_before),
+    }
+
+def iter_parsed_chunks(tasks, workers, ordered):
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(parse_chunk, tasks)
+        return
+    with mp.get_context("fork").Pool(workers) as pool:
+        yield from (pool.imap if ordered else pool.imap_unordered)(parse_chunk, tasks)
+
+def build_manifest(jsonl_file, manifest_dir=INGEST_MANIFEST_DIR, workers=INGEST_WORKERS, ordered=INGEST_ORDERED):
+    # One pass over the scraper dump: newline-aligned chunks are parsed and
+    # enriched in a process pool. Enriched records are streamed to disk for
+    # upsertion; the index keeps only what preprocessing needs (IDs and
+    # freshness dates) in memory.
+    index_file, records_file = manifest_paths(jsonl_file, manifest_dir)
+    os.makedirs(manifest_dir, exist_ok=True)
+    signature = source_signature(jsonl_file)
+
+    start = time.time()
+    tasks = chunk_ranges(jsonl_file)
+    unique_ids, freshness = set(), []
+    line_counts, chunk_errors, date_stats = {}, {}, {}
+    records = 0
+    tmp_records = f"{records_file}.tmp"
+    with open(tmp_records, "wb") as out:
+        for chunk in tqdm(iter_parsed_chunks(tasks, workers, ordered), total=len(tasks), desc=f"Ingesting JSONL ({workers} workers)"):
+            out.write(chunk["records"])
+            records += chunk["count"]
+            unique_ids.update(chunk["unique_ids"])
+            freshness.extend(chunk["freshness"])
+            line_counts[chunk["start"]] = chunk["lines"]
+            chunk_errors[chunk["start"]] = chunk["errors"]
+            merge_date_stats(date_stats, chunk["date_stats"])
+    os.replace(tmp_records, records_file)
+
+    # Line numbers are only known once every earlier chunk has been counted.
+    total_lines = 0
+    for chunk_start in sorted(line_counts):
+        for i, message in chunk_errors[chunk_start]:
+            print(f"⚠️ Skipping invalid JSON line {total_lines + i + 1}: {message}")
+        total_lines += line_counts[chunk_start]
+
+    manifest = {
+        "unique_ids": unique_ids,
+        "freshness": freshness,
+        "total_lines": total_lines,
+        "records": records,
+        "records_file": records_file,
+        "build_id": uuid.uuid4().hex,
+    }
+    save_pickle_cache(index_file, signature, manifest)
+    remove_stale_manifests(jsonl_file, manifest_dir)
+    decoder = "orjson" if json_loads is not json.loads else "json"
+    print(f"📦 Ingested {records} tenders from {total_lines} lines in {time.time() - start:.2f}s ({len(tasks)} chunks, {decoder})")
+    report_date_stats(date_stats)
+    return manifest
+
+def load_manifest(jsonl_file=JSONL_FILE, manifest_dir=INGEST_MANIFEST_DIR):
+    index_file, records_file = manifest_paths(jsonl_file, manifest_dir)
+    manifest = load_pickle_cache(index_file, source_signature(jsonl_file))
+    if manifest is None or not os.path.exists(records_file):
+        return build_manifest(jsonl_file, manifest_dir)
+    print(f"📂 Reusing ingest manifest for {jsonl_file} ({manifest['records']} tenders)")
+    return manifest
+
+def iter_records(manifest, start_offset=0, with_offsets=False):
+    # with_offsets also yields the byte offset just past each record, which
+    # is where a resumed reader would seek to continue after it.
+    with open(manifest["records_file"], "rb") as f:
+        f.seek(start_offset)
+        while True:
+            try:
+                record = pickle.load(f)
+            except EOFError:
+                return
+            yield (record, f.tell()) if with_offsets else record
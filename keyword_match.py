@@ -0,0 +1,161 @@
+import re
+import time
+import numpy as np
+from array import array
+from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import KEYWORD_MATCH_BACKEND, KEYWORD_SEARCH_WORKERS, KEYWORD_SEARCH_RETRIES, KEYWORD_CACHE_FILE, LOCAL_KEYWORD_INDEX_FILE
+from helpers import collection, load_pickle_cache, save_pickle_cache
+
+SEARCH_PATHS = [
+    "work_description",
+    "description",
+    "organization",
+    "product_category",
+    "product_sub_category"
+]
+
+TOKEN_PATTERN = re.compile(r"\w+(?:['’.]\w+)*")
+
+def normalize_keyword(keyword):
+    return " ".join(str(keyword).split()).lower()
+
+def search_keyword(keyword):
+    pipeline = [
+        {
+            "$search": {
+                "index": "TenderSearch",
+                "phrase": {"query": keyword, "path": SEARCH_PATHS}
+            }
+        },
+        {"$project": {"_id": 1}}
+    ]
+    return {doc["_id"] for doc in collection.aggregate(pipeline)}
+
+def search_keyword_with_retry(keyword, retries=KEYWORD_SEARCH_RETRIES):
+    for attempt in range(retries):
+        try:
+            return search_keyword(keyword)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            wait = 2 ** attempt
+            print(f"⚠️ Keyword search failed for '{keyword}': {e} | retrying in {wait}s")
+            time.sleep(wait)
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def build_local_index():
+    # Every token of every searched field gets one slot in a single corpus-wide
+    # stream, with a -1 separator after each field so phrases cannot straddle
+    # fields or tenders. Postings are the slot numbers of each token, grouped by
+    # token id, so a phrase is an intersection of shifted posting arrays.
+    vocab = {}
+    token_ids = array("i")
+    doc_starts = array("q")
+    ids = []
+
+    cursor = collection.find({}, {field: 1 for field in SEARCH_PATHS})
+    for doc in tqdm(cursor, desc="Indexing tenders"):
+        ids.append(doc["_id"])
+        doc_starts.append(len(token_ids))
+        for field in SEARCH_PATHS:
+            value = doc.get(field)
+            if not value:
+                continue
+            for token in tokenize(value):
+                token_ids.append(vocab.setdefault(token, len(vocab)))
+            token_ids.append(-1)
+
+    token_ids = np.frombuffer(token_ids, dtype=np.int32)
+    order = np.argsort(token_ids, kind="stable")
+    separators = int((token_ids < 0).sum())
+    counts = np.bincount(token_ids[token_ids >= 0], minlength=len(vocab))
+
+    print(f"📚 Local keyword index: {len(ids)} tenders | {len(vocab)} terms | {len(token_ids) - separators} postings")
+    return {
+        "vocab": vocab,
+        "postings": order[separators:],
+        "offsets": np.concatenate([[0], np.cumsum(counts)]),
+        "doc_starts": np.frombuffer(doc_starts, dtype=np.int64),
+        "ids": ids,
+    }
+
+def load_local_index(watermark, index_file=LOCAL_KEYWORD_INDEX_FILE):
+    index = load_pickle_cache(index_file, watermark)
+    if index is not None:
+        print(f"📂 Loaded local keyword index from {index_file}")
+        return index
+
+    index = build_local_index()
+    save_pickle_cache(index_file, watermark, index)
+    return index
+
+def search_local(index, keyword):
+    terms = tokenize(keyword)
+    if not terms:
+        return set()
+
+    positions = None
+    for i, term in enumerate(terms):
+        term_id = index["vocab"].get(term)
+        if term_id is None:
+            return set()
+        postings = index["postings"][index["offsets"][term_id]:index["offsets"][term_id + 1]] - i
+        positions = postings if positions is None else np.intersect1d(positions, postings, assume_unique=True)
+        if not len(positions):
+            return set()
+
+    docs = np.unique(np.searchsorted(index["doc_starts"], positions, side="right") - 1)
+    ids = index["ids"]
+    return {ids[d] for d in docs.tolist()}
+
+def tender_set_watermark(tenders):
+    latest_id = max((t["_id"] for t in tenders), default=None)
+    latest_update = max((t["updated_at"] for t in tenders if t.get("updated_at")), default=None)
+    return (len(tenders), str(latest_id), str(latest_update))
+
+def profile_keywords(profile):
+    return (profile.get("company_info") or {}).get("keywords") or []
+
+def resolve_keywords(profiles, watermark, backend=KEYWORD_MATCH_BACKEND):
+    keywords = {normalize_keyword(kw) for p in profiles for kw in profile_keywords(p)}
+    keywords.discard("")
+
+    cache_key = (backend,) + tuple(watermark)
+    cache = load_pickle_cache(KEYWORD_CACHE_FILE, cache_key) or {}
+    keyword_sets = {kw: cache[kw] for kw in keywords if kw in cache}
+    missing = [kw for kw in keywords if kw not in keyword_sets]
+    print(f"🔑 {len(keywords)} distinct keywords | Cached: {len(keyword_sets)} | To search: {len(missing)} | Backend: {backend}")
+
+    if missing and backend == "local":
+        index = load_local_index(watermark)
+        for kw in tqdm(missing, desc="Matching keywords locally"):
+            keyword_sets[kw] = search_local(index, kw)
+        save_pickle_cache(KEYWORD_CACHE_FILE, cache_key, {**cache, **keyword_sets})
+    elif missing:
+        failed = {}
+        with ThreadPoolExecutor(max_workers=KEYWORD_SEARCH_WORKERS) as executor:
+            futures = {executor.submit(search_keyword_with_retry, kw): kw for kw in missing}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Resolving keywords"):
+                kw = futures[future]
+                try:
+                    keyword_sets[kw] = future.result()
+                except Exception as e:
+                    failed[kw] = e
+
+        save_pickle_cache(KEYWORD_CACHE_FILE, cache_key, {**cache, **keyword_sets})
+        # Scoring without a keyword's matches would quietly drop its +10 boost;
+        # the searches that did succeed are cached for the rerun.
+        if failed:
+            kw, error = next(iter(failed.items()))
+            raise RuntimeError(f"Keyword search failed for {len(failed)} keywords (e.g. '{kw}': {error})") from error
+
+    return keyword_sets
+
+def match_keywords(keywords, keyword_sets):
+    matched = set()
+    for kw in keywords or []:
+        matched |= keyword_sets.get(normalize_keyword(kw), set())
+    return matched
@@ -8,6 +8,7 @@ from create_embeddings import create_embeddings
 from scoring import submit_for_scoring
 from rescoring import rescore
 from notifier import notify
+from config import SCORING_MODE
 from postprocessing import postprocessing
 
 if __name__ == "__main__":
@@ -38,7 +39,10 @@ if __name__ == "__main__":
     submit_for_scoring()
 
     print("\n\n\n==================== STEP 9: Recommendation Scoring for Saved ====================")
-    rescore()
+    if SCORING_MODE == "shadow":
+        print("✅ Boosts were applied to the staging collection before the swap.")
+    else:
+        rescore()
 
     print("\n\n\n==================== STEP 10: Running the Notifier script ====================")
     notify()
@@ -0,0 +1,72 @@
+import sys
+import time
+import argparse
+from datetime import datetime
+from tqdm import tqdm
+from pymongo import UpdateOne
+from config import EMBEDDING_STORAGE, EMBEDDING_DIMENSIONS, VECTOR_INDEX_DIR
+from helpers import embedding_collection
+from embedding_codec import EMBEDDING_PROJECTION, check_storage_backend, decode_embedding, encode_embedding, is_current_format
+from vector_index import read_meta, refresh_vector_index
+
+def stored_size(value):
+    return len(value) * 8 if isinstance(value, list) else len(value)
+
+def migrate_embeddings(storage=EMBEDDING_STORAGE, dimensions=EMBEDDING_DIMENSIONS, batch_size=1000, dry_run=False):
+    # Rewrites TenderEmbeddings in place, walking _id order in batches so an
+    # interrupted run can simply be started again; converted docs are skipped.
+    if not dry_run:
+        check_storage_backend(storage)
+    projection = dict(EMBEDDING_PROJECTION, embedding_dims=1)
+    total = embedding_collection.estimated_document_count()
+    start = time.time()
+    last_id = None
+    converted, skipped, bytes_before, bytes_after = 0, 0, 0, 0
+
+    with tqdm(total=total, desc=f"Migrating embeddings → {storage}/{dimensions or 'full'}") as pbar:
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            docs = list(embedding_collection.find(query, projection).sort("_id", 1).limit(batch_size))
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            pbar.update(len(docs))
+
+            ops = []
+            for doc in docs:
+                if not doc.get("embedding") or is_current_format(doc, storage, dimensions):
+                    skipped += 1
+                    continue
+                fields = encode_embedding(decode_embedding(doc), storage, dimensions)
+                bytes_before += stored_size(doc["embedding"])
+                bytes_after += stored_size(fields["embedding"])
+                update = {"$set": dict(fields, embedded_at=datetime.now())}
+                if storage == "float":
+                    update["$unset"] = {"embedding_scale": ""}
+                ops.append(UpdateOne({"_id": doc["_id"]}, update))
+
+            converted += len(ops)
+            if ops and not dry_run:
+                embedding_collection.bulk_write(ops, ordered=False)
+
+    label = "Would convert" if dry_run else "Converted"
+    print(f"✅ {label} {converted} embeddings in {time.time() - start:.2f}s | Already current: {skipped}")
+    if converted:
+        print(f"📉 Embedding payload: {bytes_before / 1e6:.1f} MB → {bytes_after / 1e6:.1f} MB")
+
+    # Rows in the local index keep their _id, so an incremental refresh would
+    # never pick the rewritten vectors up.
+    if converted and not dry_run and read_meta(VECTOR_INDEX_DIR):
+        refresh_vector_index(rebuild=True)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Rewrite stored tender embeddings into the configured compact format.")
+    parser.add_argument("--storage", default=EMBEDDING_STORAGE, choices=["float", "float16", "int8"])
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS, help="truncate vectors to this many dimensions")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    migrate_embeddings(args.storage, args.dimensions, args.batch_size, args.dry_run)
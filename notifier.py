@@ -1,5 +1,6 @@
 from bson import ObjectId
 from datetime import datetime, timezone, date
+from config import SCORE_TOP_K_LOW, SCORE_TOP_K_HIGH
 from helpers import collection, profile_collection, score_collection, notification_collection
 
 TODAY_STR = date.today().isoformat()
@@ -36,13 +37,13 @@ def get_high_compatibility_tenders(user_id):
     low_value_scores.sort(key=lambda x: x[0], reverse=True)
     high_value_scores.sort(key=lambda x: x[0], reverse=True)
 
-    low_threshold = low_value_scores[49][0] if len(low_value_scores) >= 50 else (low_value_scores[-1][0] if low_value_scores else 0)
-    high_threshold = high_value_scores[9][0] if len(high_value_scores) >= 10 else (high_value_scores[-1][0] if high_value_scores else 0)
+    low_threshold = low_value_scores[SCORE_TOP_K_LOW - 1][0] if len(low_value_scores) >= SCORE_TOP_K_LOW else (low_value_scores[-1][0] if low_value_scores else 0)
+    high_threshold = high_value_scores[SCORE_TOP_K_HIGH - 1][0] if len(high_value_scores) >= SCORE_TOP_K_HIGH else (high_value_scores[-1][0] if high_value_scores else 0)
 
-    print(f"User={user_id} | Low-value threshold (50th) = {low_threshold} | High-value threshold (10th) = {high_threshold}")
+    print(f"User={user_id} | Low-value threshold ({SCORE_TOP_K_LOW}th) = {low_threshold} | High-value threshold ({SCORE_TOP_K_HIGH}th) = {high_threshold}")
 
-    top_low = low_value_scores[:50]
-    top_high = high_value_scores[:10]
+    top_low = low_value_scores[:SCORE_TOP_K_LOW]
+    top_high = high_value_scores[:SCORE_TOP_K_HIGH]
 
     notifications = []
     for score, tender in top_low + top_high:
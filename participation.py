@@ -0,0 +1,114 @@
+import time
+from bson import ObjectId
+from config import RESULTS_COLLECTION, PARTICIPATION_STATS_COLLECTION
+from helpers import competitor_collection, participation_stats_collection
+
+def trimmed(field):
+    value = {"$ifNull": [field, None]}
+    return {"$cond": [
+        {"$in": [value, [None, "", 0, False]]},
+        None,
+        {"$trim": {"input": {"$toString": value}}}
+    ]}
+
+def counts_of(kind):
+    return {"$filter": {
+        "input": "$counts",
+        "as": "c",
+        "cond": {"$and": [{"$eq": ["$$c.kind", kind]}, {"$ne": ["$$c.value", None]}]}
+    }}
+
+def refresh_participation_stats(names=None):
+    # Scoring only reads the competitors behind a profile, so with names set
+    # just those are recomputed. That is small enough to redo every run, which
+    # also catches edited Results and removed competitors.
+    run_id = ObjectId()
+    pipeline = []
+    if names is not None:
+        pipeline.append({"$match": {"name": {"$in": names}}})
+
+    pipeline += [
+        {"$project": {
+            "name": 1,
+            "tender_ids": {"$setUnion": [{"$ifNull": ["$participated_tenders", []]}, []]}
+        }},
+        {"$set": {"tender_count": {"$size": "$tender_ids"}}},
+        # One Result per lookup; a lookup over the whole array builds a single
+        # document that large competitors push past 16MB.
+        {"$unwind": {"path": "$tender_ids", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": RESULTS_COLLECTION,
+            "localField": "tender_ids",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"organization": 1, "website": 1}}],
+            "as": "results"
+        }},
+        {"$unwind": {"path": "$results", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "name": 1,
+            "tender_count": 1,
+            "keys": [
+                {"kind": "organization", "value": trimmed("$results.organization")},
+                {"kind": "website", "value": trimmed("$results.website")},
+            ]
+        }},
+        {"$unwind": "$keys"},
+        {"$group": {
+            "_id": {"competitor": "$_id", "kind": "$keys.kind", "value": "$keys.value"},
+            "name": {"$first": "$name"},
+            "tender_count": {"$first": "$tender_count"},
+            "count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.competitor",
+            "name": {"$first": "$name"},
+            "tender_count": {"$first": "$tender_count"},
+            "counts": {"$push": {"kind": "$_id.kind", "value": "$_id.value", "count": "$count"}}
+        }},
+        {"$project": {
+            "name": 1,
+            "tender_count": 1,
+            "organizations": counts_of("organization"),
+            "websites": counts_of("website"),
+            "refresh_id": {"$literal": run_id},
+            "refreshed_at": "$$NOW"
+        }},
+        {"$merge": {
+            "into": PARTICIPATION_STATS_COLLECTION,
+            "on": "_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+    start = time.time()
+    competitor_collection.create_index([("name", 1)])
+    competitor_collection.aggregate(pipeline, allowDiskUse=True)
+    removed = participation_stats_collection.delete_many({"refresh_id": {"$ne": run_id}}).deleted_count
+    participation_stats_collection.create_index([("name", 1)])
+    scope = "all competitors" if names is None else f"{len(names)} profile companies"
+    print(f"📈 Participation stats refreshed in {time.time() - start:.2f}s for {scope} | Stored: {participation_stats_collection.estimated_document_count()} | Removed: {removed}")
+
+def participation_from_stats(stats):
+    org_counts = {o["value"]: o["count"] for o in stats.get("organizations") or []}
+    web_counts = {w["value"]: w["count"] for w in stats.get("websites") or []}
+
+    total_orgs = sum(org_counts.values()) or 1
+
+    participation_scores = {}
+    for web, count in web_counts.items():
+        participation_scores[web] = (count / total_orgs) * 5
+    for org, count in org_counts.items():
+        base = (count / total_orgs) * 10
+        participation_scores[org] = base + 5
+
+    return participation_scores
+
+def load_participation_maps(names=None):
+    query = {} if names is None else {"name": {"$in": names}}
+    maps = {}
+    for stats in participation_stats_collection.find(query).sort("_id", 1):
+        if stats.get("name") not in maps:
+            maps[stats.get("name")] = participation_from_stats(stats)
+    print(f"📥 Loaded participation maps for {len(maps)} competitors.")
+    return maps
@@ -1,9 +1,7 @@
-import json
-from tqdm import tqdm
 from bson import ObjectId
-from dateutil import parser
 from config import JSONL_FILE
-from helpers import collection, embedding_collection, parse_date_naive
+from helpers import collection, embedding_collection
+from ingest import load_manifest
 
 def get_latest_updated_at(collection):
     latest_doc = collection.find_one(
@@ -20,21 +18,8 @@ def get_latest_updated_at(collection):
     print(f"\n🕒 Latest updated_at in Mongo: {latest_mongo_updated}")
     return latest_mongo_updated
 
-def find_closed_tenders(jsonl_file):
-    jsonl_ids = set()
-    with open(jsonl_file, "r", encoding="utf-8") as f:
-        for line in tqdm(f, desc="Reading JSONL"):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-                uid = obj.get("UniqueIdentifier")
-                if uid:
-                    jsonl_ids.add(uid)
-            except json.JSONDecodeError:
-                continue
-
+def find_closed_tenders(manifest):
+    jsonl_ids = manifest["unique_ids"]
     print(f"\n📦 Found {len(jsonl_ids)} unique IDs in JSONL")
 
     mongo_ids = set(
@@ -46,46 +31,25 @@ def find_closed_tenders(jsonl_file):
     print(f"🗂️ Found {len(closed)} closed tenders (in Mongo but not in JSONL)")
     return closed
 
-def find_stale_tenders(jsonl_file):
+def find_stale_tenders(manifest):
     latest_mongo_updated = get_latest_updated_at(collection)
 
     fresh, stale = [], []
 
-    with open(jsonl_file, "r", encoding="utf-8") as f:
-        for line in tqdm(f, desc="Scanning JSONL for freshness"):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                tender = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            published_str = tender.get("CriticalDates", {}).get("PublishedDate")
-            published = parse_date_naive(published_str)
-
-            latest_corr = None
-            for corr in tender.get("Corrigenda") or []:
-                for d in corr.get("Details") or []:
-                    dt_str = d.get("PublishedDate")
-                    dt = parse_date_naive(dt_str)
-                    if dt and (latest_corr is None or dt > latest_corr):
-                        latest_corr = dt
-
-            most_recent = max([d for d in [published, latest_corr] if d is not None], default=None)
-
-            if most_recent and most_recent > latest_mongo_updated:
-                fresh.append(tender)
-            else:
-                stale.append(tender)
+    for unique_id, most_recent in manifest["freshness"]:
+        if most_recent and most_recent > latest_mongo_updated:
+            fresh.append(unique_id)
+        else:
+            stale.append(unique_id)
 
     print(f"🆕 Fresh tenders: {len(fresh)}")
     print(f"📉 Stale tenders: {len(stale)}")
     return fresh, stale
 
 def preprocessing():
-    closed = find_closed_tenders(JSONL_FILE)
-    fresh, stale = find_stale_tenders(JSONL_FILE)
+    manifest = load_manifest(JSONL_FILE)
+    closed = find_closed_tenders(manifest)
+    fresh, stale = find_stale_tenders(manifest)
 
     print(f"\n🔸 Closed tenders to delete from Mongo: {len(closed)}")
     print(f"🔸 Stale tenders to delete from JSONL: {len(stale)}")
@@ -1,4 +1,5 @@
 from tqdm import tqdm
+from datetime import datetime
 import multiprocessing as mp
 from pymongo import UpdateMany
 from config import NUM_WORKERS_OLA, BATCH_SIZE
@@ -48,13 +49,17 @@ def process_coordinates(all_missing, existing_coords, to_geocode):
 
     bulk_ops = []
     count = 0
+    geocoded_at = datetime.now()
     for loc in all_missing:
         coords = existing_coords.get(loc, [])
 
+        # geocoded_at lets incremental scoring find tenders whose coordinates
+        # arrived after they were last scored.
+        fields = {"coordinates": coords, "geocoded_at": geocoded_at} if coords else {"coordinates": coords}
         bulk_ops.append(
             UpdateMany(
                 {"location": loc, "$or": [{"coordinates": {"$exists": False}}, {"coordinates": {"$size": 0}}]},
-                {"$set": {"coordinates": coords}}
+                {"$set": fields}
             )
         )
 
@@ -0,0 +1,74 @@
+import time
+import threading
+
+def new_rate_limiter(tokens_per_minute, requests_per_minute, max_concurrency):
+    # Shared by every embedding worker: two token buckets (tokens and
+    # requests per minute) plus an in-flight limit that halves on a 429 and
+    # creeps back up one slot at a time while requests keep succeeding.
+    return {
+        "cond": threading.Condition(),
+        "tpm": tokens_per_minute,
+        "rpm": requests_per_minute,
+        "tokens": float(tokens_per_minute),
+        "requests": float(requests_per_minute),
+        "updated": time.monotonic(),
+        "limit": max_concurrency,
+        "max_limit": max_concurrency,
+        "active": 0,
+        "paused_until": 0.0,
+        "successes": 0,
+        "throttles": 0,
+    }
+
+def _refill(limiter, now):
+    elapsed = now - limiter["updated"]
+    limiter["updated"] = now
+    limiter["tokens"] = min(limiter["tpm"], limiter["tokens"] + elapsed * limiter["tpm"] / 60)
+    limiter["requests"] = min(limiter["rpm"], limiter["requests"] + elapsed * limiter["rpm"] / 60)
+
+def acquire(limiter, tokens):
+    tokens = min(tokens, limiter["tpm"])
+    with limiter["cond"]:
+        while True:
+            now = time.monotonic()
+            _refill(limiter, now)
+            waits = [limiter["paused_until"] - now]
+            if limiter["tokens"] < tokens:
+                waits.append((tokens - limiter["tokens"]) * 60 / limiter["tpm"])
+            if limiter["requests"] < 1:
+                waits.append((1 - limiter["requests"]) * 60 / limiter["rpm"])
+
+            wait = max(waits)
+            if limiter["active"] < limiter["limit"] and wait <= 0:
+                limiter["tokens"] -= tokens
+                limiter["requests"] -= 1
+                limiter["active"] += 1
+                return
+
+            # Waiting on a free slot only ends with release(); bucket waits time out.
+            limiter["cond"].wait(wait if wait > 0 else None)
+
+def release(limiter, estimated_tokens=0, used_tokens=None, throttled=False, retry_after=None):
+    with limiter["cond"]:
+        limiter["active"] -= 1
+        if used_tokens is not None:
+            limiter["tokens"] += min(estimated_tokens, limiter["tpm"]) - used_tokens
+
+        if throttled:
+            now = time.monotonic()
+            limiter["throttles"] += 1
+            limiter["successes"] = 0
+            # Requests already in flight when the first 429 lands fail together;
+            # count that burst as one signal instead of halving once per request.
+            if now >= limiter["paused_until"]:
+                limiter["limit"] = max(1, limiter["limit"] // 2)
+            pause = retry_after if retry_after is not None else 2 ** min(limiter["throttles"], 6)
+            limiter["paused_until"] = max(limiter["paused_until"], now + pause)
+            print(f"🚦 Rate limited — concurrency {limiter['limit']}, pausing {pause:.1f}s")
+        else:
+            limiter["successes"] += 1
+            if limiter["limit"] < limiter["max_limit"] and limiter["successes"] >= limiter["limit"] * 4:
+                limiter["limit"] += 1
+                limiter["successes"] = 0
+
+        limiter["cond"].notify_all()
@@ -1,11 +1,58 @@
 import time
+import numpy as np
 from tqdm import tqdm
 from bson import ObjectId
 from pymongo import UpdateOne
-from config import VECTOR_INDEX_NAME, TOP_K
-from helpers import profile_collection, score_collection, embedding_collection
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import (
+    VECTOR_INDEX_NAME,
+    TOP_K,
+    EMBEDDING_PREFETCH_BATCH,
+    VECTOR_SEARCH_CACHE_FILE,
+    VECTOR_SEARCH_BACKEND,
+    VECTOR_SEARCH_CONCURRENCY,
+    RESCORE_QUERY_MODE,
+    QUERY_CLUSTER_THRESHOLD,
+    QUERY_CLUSTER_LIMIT_FACTOR,
+    EMBEDDING_STORAGE,
+    EMBEDDING_DIMENSIONS
+)
+from helpers import (
+    profile_collection,
+    score_collection,
+    embedding_collection,
+    load_pickle_cache,
+    save_pickle_cache
+)
+from embedding_codec import EMBEDDING_PROJECTION, decode_embedding
+from vector_index import (
+    refresh_vector_index,
+    load_vector_index,
+    search_vector_index,
+    search_many,
+    live_rows,
+    normalize_rows
+)
 
-def vector_search(query_vec, top_k=TOP_K):
+_local_index = None
+
+def local_vector_index():
+    global _local_index
+    if _local_index is None:
+        refresh_vector_index()
+        _local_index = load_vector_index()
+    return _local_index
+
+def vector_search(query_vec, top_k=TOP_K, backend=None):
+    backend = VECTOR_SEARCH_BACKEND if backend is None else backend
+    if backend == "local":
+        start = time.time()
+        results = search_vector_index(local_vector_index(), [query_vec], top_k)[0]
+        print(f"⏱ Vector search (local): {time.time() - start:.2f}s — {len(results)} results")
+        return results
+    return atlas_vector_search(query_vec, top_k)
+
+def atlas_vector_search(query_vec, top_k=TOP_K):
     pipeline = [
         {
             "$vectorSearch": {
@@ -29,84 +76,304 @@ def vector_search(query_vec, top_k=TOP_K):
     print(f"⏱ Vector search: {time.time() - start:.2f}s — {len(results)} results")
     return results
 
-def rescore():
+def prefetch_embeddings(tender_ids, batch_size=EMBEDDING_PREFETCH_BATCH, label="saved-tender"):
+    ids = list(tender_ids)
+    embeddings = {}
+    start = time.time()
+    for i in range(0, len(ids), batch_size):
+        cursor = embedding_collection.find(
+            {"tender_id": {"$in": ids[i:i + batch_size]}},
+            EMBEDDING_PROJECTION
+        )
+        for doc in cursor:
+            if "embedding" in doc:
+                embeddings.setdefault(doc["tender_id"], decode_embedding(doc))
+
+    queries = (len(ids) + batch_size - 1) // batch_size
+    print(f"📥 Prefetched {len(embeddings)}/{len(ids)} {label} embeddings in {queries} queries ({time.time() - start:.2f}s)")
+    return embeddings
+
+def embedding_set_watermark():
+    latest = embedding_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    # Re-embedding a tender rewrites its document in place, so the newest
+    # _id alone would keep stale searches cached.
+    reembedded = embedding_collection.find_one({"embedded_at": {"$exists": True}}, {"embedded_at": 1}, sort=[("embedded_at", -1)])
+    return (
+        embedding_collection.estimated_document_count(),
+        str(latest["_id"]) if latest else None,
+        str(reembedded["embedded_at"]) if reembedded else None,
+        TOP_K,
+        VECTOR_SEARCH_BACKEND,
+        EMBEDDING_STORAGE,
+        EMBEDDING_DIMENSIONS
+    )
+
+def load_search_cache(cache_file=VECTOR_SEARCH_CACHE_FILE, query_mode=RESCORE_QUERY_MODE):
+    if not cache_file:
+        return {}, None
+    # Clustered results are top-K within a candidate pool, not exact searches;
+    # the two modes never share cached results.
+    watermark = embedding_set_watermark() + (query_mode,)
+    cache = load_pickle_cache(cache_file, watermark) or {}
+    print(f"📂 Loaded {len(cache)} cached vector searches.")
+    return cache, watermark
+
+def prefill_local_searches(embeddings, search_cache):
+    # The local index answers a whole batch of queries with one pass over the
+    # matrix, so resolve every uncached saved tender up front.
+    pending = [tid for tid in embeddings if tid not in search_cache]
+    if not pending:
+        return 0
+    start = time.time()
+    results = search_many(local_vector_index(), [embeddings[tid] for tid in pending], TOP_K)
+    search_cache.update(zip(pending, results))
+    print(f"⏱ Local vector search: {len(pending)} queries in {time.time() - start:.2f}s")
+    return len(pending)
+
+def merge_boosts(user_tender_max, similar_tenders):
+    for sim in similar_tenders:
+        tender_id = ObjectId(sim["tender_id"])
+        additional_score = round(sim["score"] * 10, 2)
+
+        if tender_id not in user_tender_max or additional_score > user_tender_max[tender_id]:
+            user_tender_max[tender_id] = additional_score
+
+def timed_search(query_vec, top_k=TOP_K):
+    start = time.perf_counter()
+    results = vector_search(query_vec, top_k=top_k)
+    return [{"tender_id": s["tender_id"], "score": s["score"]} for s in results], time.perf_counter() - start
+
+def latency_summary(latencies):
+    if not latencies:
+        return "no searches run"
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return f"p50 {p50 * 1000:.0f}ms | p90 {p90 * 1000:.0f}ms | p99 {p99 * 1000:.0f}ms | max {max(latencies) * 1000:.0f}ms"
+
+def cluster_queries(vectors, threshold=QUERY_CLUSTER_THRESHOLD):
+    # Greedy single pass: a saved tender joins the first group whose running
+    # centroid is within `threshold` cosine, otherwise it starts a new group.
+    sums, members = [], []
+    for i, vec in enumerate(vectors):
+        if sums:
+            centroids = np.array(sums)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+            sims = centroids @ vec
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                sums[best] += vec
+                members[best].append(i)
+                continue
+        sums.append(vec.copy())
+        members.append([i])
+    return [s / np.linalg.norm(s) for s in sums], members
+
+def clustered_searches(saved_tids, embeddings, top_k=TOP_K, threshold=QUERY_CLUSTER_THRESHOLD, limit_factor=QUERY_CLUSTER_LIMIT_FACTOR):
+    # One search per group centroid with a wider limit builds a candidate
+    # pool; each saved tender then takes its own exact top-K from that pool.
+    # With the local backend candidates are re-ranked against the rows already
+    # in the memory-mapped index; with Atlas their embeddings come from Mongo.
+    saved = normalize_rows([embeddings[tid] for tid in saved_tids])
+    centroids, members = cluster_queries(saved, threshold)
+
+    candidates, latencies = set(), []
+    for centroid, group in zip(centroids, members):
+        results, elapsed = timed_search(centroid.tolist(), top_k * min(len(group), limit_factor))
+        latencies.append(elapsed)
+        candidates.update(r["tender_id"] for r in results)
+
+    if VECTOR_SEARCH_BACKEND == "local":
+        index = local_vector_index()
+        rows = live_rows(index)
+        candidate_ids = sorted((tid for tid in candidates if tid in rows), key=rows.get)
+    else:
+        fetched = prefetch_embeddings(candidates, label="candidate")
+        candidate_ids = sorted(fetched)
+
+    dropped = len(candidates) - len(candidate_ids)
+    if dropped:
+        print(f"⚠️ {dropped}/{len(candidates)} candidates have no stored embedding and were skipped.")
+    if not candidate_ids:
+        return {tid: [] for tid in saved_tids}, latencies, len(centroids)
+
+    if VECTOR_SEARCH_BACKEND == "local":
+        matrix = np.asarray(index["matrix"][[rows[tid] for tid in candidate_ids]], dtype=np.float32)
+    else:
+        matrix = normalize_rows([fetched[tid] for tid in candidate_ids])
+    sims = saved @ matrix.T
+    k = min(top_k, len(candidate_ids))
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+
+    results = {}
+    for row, tid in enumerate(saved_tids):
+        results[tid] = [
+            {"tender_id": candidate_ids[col], "score": (1 + float(sims[row, col])) / 2}
+            for col in top[row].tolist()
+        ]
+    return results, latencies, len(centroids)
+
+def apply_boosts(target_collection, user_id, profile_name, user_tender_max):
+    try:
+        batch_ops = [
+            UpdateOne(
+                {"tender_id": tid, "user_id": user_id},
+                [
+                    {"$set": {
+                        "base_score": {"$ifNull": ["$base_score", {"$ifNull": ["$score", 0]}]}
+                    }},
+                    {"$set": {
+                        "score": {
+                            "$round": [
+                                {"$min": [{"$add": ["$base_score", score]}, 100]},
+                                2
+                            ]
+                        }
+                    }}
+                ],
+                upsert=True
+            )
+            for tid, score in user_tender_max.items()
+        ]
+        target_collection.bulk_write(batch_ops, ordered=False)
+        print(f"   ✅ Scores applied successfully for user '{profile_name}'")
+    except Exception as e:
+        print(f"   ⚠ Error during bulk write for user '{profile_name}': {e}")
+
+def rescore(target_collection=None, concurrency=VECTOR_SEARCH_CONCURRENCY, query_mode=RESCORE_QUERY_MODE):
+    target_collection = score_collection if target_collection is None else target_collection
+    stage_start = time.time()
     profiles_cursor = profile_collection.find({}, {"saved_tenders": 1, "user_id": 1, "company_name": 1})
     profiles = list(profiles_cursor)
     
     print(f"🟢 Found {len(profiles)} profiles.")
 
-    for profile_idx, profile in enumerate(tqdm(profiles, desc="Processing profiles"), start=1):
-        profile_name = profile.get("company_name", "<unknown>")
-        saved_ids = profile.get("saved_tenders", [])
-        user_id = profile.get("user_id")
+    saved_tender_ids = {
+        item.get("id")
+        for profile in profiles
+        for item in profile.get("saved_tenders", [])
+        if item.get("id")
+    }
+    embeddings = prefetch_embeddings(saved_tender_ids)
+    clustered = query_mode == "clustered"
+    search_cache, search_watermark = load_search_cache(query_mode=query_mode)
+    prefilled, searches_reused = 0, 0
+    if VECTOR_SEARCH_BACKEND == "local" and not clustered:
+        # Prefilled searches are hit once below as if cached; don't count that as reuse.
+        prefilled = prefill_local_searches(embeddings, search_cache)
+        searches_reused -= prefilled
+    if clustered and VECTOR_SEARCH_BACKEND == "local":
+        # Loaded (and refreshed) once here rather than racing in the search threads.
+        local_vector_index()
 
-        print(f"\n📌 Processing profile {profile_idx}/{len(profiles)}: {profile_name}")
+    # Every uncached saved tender is searched once, up to `concurrency` at a
+    # time; profiles then merge results as they land while the previous
+    # profile's bulk_write runs on the writer thread.
+    # In clustered mode a job covers the uncached saved tenders a profile is
+    # the first to need, and later profiles wait on that job for them.
+    searches = {}
+    latencies, clustered_queries, clustered_groups = [], 0, 0
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as searcher, ThreadPoolExecutor(max_workers=1) as writer:
+        if clustered:
+            for profile in profiles:
+                saved_tids = list(dict.fromkeys(
+                    item.get("id") for item in profile.get("saved_tenders", [])
+                    if item.get("id") in embeddings and item.get("id") not in search_cache and item.get("id") not in searches
+                ))
+                if saved_tids:
+                    job = searcher.submit(clustered_searches, saved_tids, embeddings)
+                    searches.update(dict.fromkeys(saved_tids, job))
+                    clustered_queries += len(saved_tids)
+        else:
+            for tid, query_vec in embeddings.items():
+                if tid not in search_cache:
+                    searches[tid] = searcher.submit(timed_search, query_vec, TOP_K)
+        finished_jobs = set()
 
-        if not saved_ids:
-            print(f"⚠ No saved tenders for user '{profile_name}'. Skipping...")
-            continue
+        pending_write = None
+        for profile_idx, profile in enumerate(tqdm(profiles, desc="Processing profiles"), start=1):
+            profile_name = profile.get("company_name", "<unknown>")
+            saved_ids = profile.get("saved_tenders", [])
+            user_id = profile.get("user_id")
 
-        if isinstance(user_id, str):
-            try:
-                user_id = ObjectId(user_id)
-            except Exception as e:
-                print(f"⚠ Error converting user_id to ObjectId: {e}")
+            print(f"\n📌 Processing profile {profile_idx}/{len(profiles)}: {profile_name}")
 
-        user_tender_max = {}
+            if not saved_ids:
+                print(f"⚠ No saved tenders for user '{profile_name}'. Skipping...")
+                continue
 
-        for idx, item in enumerate(saved_ids, start=1):
-            tid = item.get("id")  # stringified tender ObjectId
-            print(f"   🔹 Processing saved tender {idx}/{len(saved_ids)}: {tid}")
+            if isinstance(user_id, str):
+                try:
+                    user_id = ObjectId(user_id)
+                except Exception as e:
+                    print(f"⚠ Error converting user_id to ObjectId: {e}")
 
-            if not tid:
-                print("   ⚠ Invalid saved_tender entry, missing 'id'. Skipping...")
-                continue
+            user_tender_max = {}
+            waiting = {}
 
-            emb_doc = embedding_collection.find_one({"tender_id": tid}, {"embedding": 1})
-            if not emb_doc or "embedding" not in emb_doc:
-                print(f"   ⚠ Tender ID {tid} has no embedding. Skipping...")
-                continue
+            for idx, item in enumerate(saved_ids, start=1):
+                tid = item.get("id")  # stringified tender ObjectId
+                print(f"   🔹 Processing saved tender {idx}/{len(saved_ids)}: {tid}")
 
-            query_vec = emb_doc["embedding"]
+                if not tid:
+                    print("   ⚠ Invalid saved_tender entry, missing 'id'. Skipping...")
+                    continue
 
-            try:
-                similar_tenders = vector_search(query_vec, top_k=TOP_K)
-            except Exception as e:
-                print(f"   ⚠ Error during vector search for tender {tid}: {e}")
-                continue
+                if tid not in embeddings:
+                    print(f"   ⚠ Tender ID {tid} has no embedding. Skipping...")
+                    continue
 
-            print(f"      Found {len(similar_tenders)} similar tenders.")
-
-            for sim in similar_tenders:
-                tender_id = ObjectId(sim["tender_id"])  
-                additional_score = round(sim["score"] * 10, 2)
-
-                if tender_id not in user_tender_max or additional_score > user_tender_max[tender_id]:
-                    user_tender_max[tender_id] = additional_score
-
-        if user_tender_max:
-            print(f"   🟢 Applying scores to {len(user_tender_max)} tenders for user '{profile_name}'...")
-            try:
-                batch_ops = [
-                    UpdateOne(
-                        {"tender_id": tid, "user_id": user_id},
-                        [
-                            {"$set": {
-                                "score": {
-                                    "$round": [
-                                        {"$min": [{"$add": [{"$ifNull": ["$score", 0]}, score]}, 100]},
-                                        2
-                                    ]
-                                }
-                            }}
-                        ],
-                        upsert=True
-                    )
-                    for tid, score in user_tender_max.items()
-                ]
-                score_collection.bulk_write(batch_ops, ordered=False)
-                print(f"   ✅ Scores applied successfully for user '{profile_name}'")
-            except Exception as e:
-                print(f"   ⚠ Error during bulk write for user '{profile_name}': {e}")
-        else:
-            print(f"   ⚠ No similarity scores to apply for user '{profile_name}'")
+                if tid in search_cache:
+                    searches_reused += 1
+                    merge_boosts(user_tender_max, search_cache[tid])
+                elif tid in searches:
+                    waiting.setdefault(searches[tid], []).append(tid)
+
+            for future in as_completed(waiting):
+                tids = waiting[future]
+                if clustered:
+                    try:
+                        results, job_latencies, groups = future.result()
+                    except Exception as e:
+                        print(f"   ⚠ Error during clustered vector search for user '{profile_name}': {e}")
+                        continue
+                    # A job is shared by every profile that saved one of its
+                    # tenders; count its searches once.
+                    if future not in finished_jobs:
+                        finished_jobs.add(future)
+                        latencies.extend(job_latencies)
+                        clustered_groups += groups
+                        search_cache.update(results)
+                    for tid in tids:
+                        merge_boosts(user_tender_max, results[tid])
+                    print(f"      Served {len(tids)} saved tenders from {groups} grouped searches.")
+                    continue
+
+                tid = tids[0]
+                try:
+                    similar_tenders, elapsed = future.result()
+                except Exception as e:
+                    print(f"   ⚠ Error during vector search for tender {tid}: {e}")
+                    continue
+                search_cache[tid] = similar_tenders
+                latencies.append(elapsed)
+                print(f"      Found {len(similar_tenders)} similar tenders for {tid}.")
+                merge_boosts(user_tender_max, similar_tenders)
+
+            if pending_write is not None:
+                pending_write.result()
+                pending_write = None
+
+            if user_tender_max:
+                print(f"   🟢 Applying scores to {len(user_tender_max)} tenders for user '{profile_name}'...")
+                pending_write = writer.submit(apply_boosts, target_collection, user_id, profile_name, user_tender_max)
+            else:
+                print(f"   ⚠ No similarity scores to apply for user '{profile_name}'")
+
+        if pending_write is not None:
+            pending_write.result()
+
+    print(f"\n🔎 Vector searches run: {len(latencies) + prefilled} | Reused from cache: {searches_reused} | Concurrency: {concurrency}")
+    if clustered:
+        print(f"🧩 Clustered mode: {clustered_queries} saved-tender queries served by {clustered_groups} searches")
+    print(f"⏱ Search latency: {latency_summary(latencies)} | Stage wall time: {time.time() - stage_start:.2f}s")
+    if search_watermark is not None:
+        save_pickle_cache(VECTOR_SEARCH_CACHE_FILE, search_watermark, search_cache)
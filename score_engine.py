@@ -0,0 +1,192 @@
+import math
+import numpy as np
+
+DEFAULT_MIDPOINT = 500000000
+EARTH_RADIUS_KM = 6371.0
+
+def _factorize(values):
+    index = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(index)
+        codes[i] = code
+    return codes, index
+
+def build_tender_table(tenders):
+    rows = [t for t in tenders if t.get("tender_value") is not None]
+    n = len(rows)
+
+    # process_coordinates geocodes per distinct location string, so tenders
+    # share a few hundred points; distances are computed once per point.
+    point_codes, point_index = _factorize([tuple(c) if c else None for c in (t.get("coordinates") for t in rows)])
+    points = list(point_index)
+    point_lat = np.array([p[0] if p else 0.0 for p in points], dtype=np.float64)
+    point_lon = np.array([p[1] if p else 0.0 for p in points], dtype=np.float64)
+    point_has_coords = np.array([p is not None for p in points], dtype=bool)
+
+    org_codes, org_index = _factorize([t.get("organization") for t in rows])
+    web_codes, web_index = _factorize([t.get("website") for t in rows])
+    cat_codes, cat_index = _factorize([t.get("category") for t in rows])
+
+    ids = [t["_id"] for t in rows]
+    return {
+        "size": n,
+        "ids": ids,
+        "id_index": {tid: i for i, tid in enumerate(ids)},
+        "value": np.fromiter((t["tender_value"] for t in rows), dtype=np.float64, count=n),
+        "point_codes": point_codes,
+        "point_lat": point_lat,
+        "point_lon": point_lon,
+        "point_has_coords": point_has_coords,
+        "org_codes": org_codes,
+        "org_index": org_index,
+        "web_codes": web_codes,
+        "web_index": web_index,
+        "cat_codes": cat_codes,
+        "cat_index": cat_index,
+    }
+
+def round_like_python(values, ndigits):
+    # np.round scales by 10**n before rounding, so values sitting on a decimal
+    # tie (12.35 is really 12.3499...) can round the other way. Those few are
+    # handed back to the builtin round so results stay identical to the scalar path.
+    rounded = np.round(values, ndigits)
+    scaled = values * (10.0 ** ndigits)
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+def haversine_many(lat, lon, coords):
+    lat2, lon2 = coords
+    dlat = np.radians(lat2 - lat)
+    dlon = np.radians(lon2 - lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(lat)) * math.cos(math.radians(lat2)) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+def big_proximity_curve(dist_km):
+    return np.select(
+        [dist_km <= 50, dist_km <= 250, dist_km <= 500],
+        [25.0, 25 - ((dist_km - 50) / 200) * 10, 15 - ((dist_km - 250) / 250) * 5],
+        default=5.0
+    )
+
+def small_proximity_curve(dist_km):
+    return np.select(
+        [dist_km <= 50, dist_km <= 200],
+        [55 - ((dist_km / 50) * 10), 45 - ((dist_km - 50) / 150 * (45 - 10))],
+        default=np.maximum(0, 10 - ((dist_km - 200) / 800) * 10)
+    )
+
+def profile_sites(company_info):
+    return company_info.get("hq_locations", []) + company_info.get("regional_offices", []) + company_info.get("ongoing_sites", [])
+
+def proximity_scores(company_info, table):
+    n = len(table["point_lat"])
+    sites = profile_sites(company_info)
+    if not sites:
+        return np.full(n, 25.0), np.full(n, 55.0)
+
+    site_coords = [(site.get("coordinates"), site.get("factor", 1)) for site in sites if site.get("coordinates")]
+    best_big = np.zeros(n)
+    best_small = np.zeros(n)
+    if site_coords:
+        distances = np.stack([haversine_many(table["point_lat"], table["point_lon"], coords) for coords, _ in site_coords], axis=1)
+        factors = np.array([factor for _, factor in site_coords], dtype=np.float64)
+        best_big = np.maximum(best_big, (big_proximity_curve(distances) * factors).max(axis=1))
+        best_small = np.maximum(best_small, (small_proximity_curve(distances) * factors).max(axis=1))
+
+    has_coords = table["point_has_coords"]
+    return np.where(has_coords, best_big, 15.0), np.where(has_coords, best_small, 35.0)
+
+def big_amount_fit(company_info, value):
+    min_amt, max_amt = company_info.get("preferred_tender_amount_range", (0, 0))
+    midpoint = (min_amt + max_amt) / 2
+    if midpoint == min_amt or min_amt >= max_amt:
+        return np.zeros(len(value))
+    return np.select(
+        [(value <= min_amt) | (value >= max_amt), value <= midpoint],
+        [0.0, ((value - min_amt) / (midpoint - min_amt)) * 30],
+        default=((max_amt - value) / (max_amt - midpoint)) * 30
+    )
+
+def small_amount_fit(company_info, value):
+    midpoint = company_info.get("midpoint") or DEFAULT_MIDPOINT
+    return (value / midpoint) * 10
+
+def participation_columns(participation_scores, table):
+    org_values = np.zeros(len(table["org_index"]))
+    web_values = np.zeros(len(table["web_index"]))
+    for key, value in participation_scores.items():
+        if (code := table["org_index"].get(key)) is not None:
+            org_values[code] = value
+        if (code := table["web_index"].get(key)) is not None:
+            web_values[code] = value
+    return org_values[table["org_codes"]], web_values[table["web_codes"]]
+
+def index_mask(tender_ids, table):
+    mask = np.zeros(table["size"], dtype=bool)
+    id_index = table["id_index"]
+    positions = [id_index[tid] for tid in tender_ids if tid in id_index]
+    if positions:
+        mask[positions] = True
+    return mask
+
+def score_profile(company_info, midpoint, participation_scores, matching_tender_ids, table):
+    value = table["value"]
+    point_codes = table["point_codes"]
+    prox_big, prox_small = proximity_scores(company_info, table)
+    org_part, web_part = participation_columns(participation_scores, table)
+
+    big_scores = round_like_python(
+        round_like_python(big_amount_fit(company_info, value), 2)
+        + round_like_python(prox_big, 2)[point_codes]
+        + (org_part + web_part)
+        + 10,
+        1
+    )
+    small_scores = round_like_python(
+        round_like_python(small_amount_fit(company_info, value), 2)
+        + round_like_python(prox_small, 2)[point_codes]
+        + (org_part / 3 + web_part / 2),
+        1
+    )
+    scores = np.where(value >= midpoint, big_scores, small_scores)
+
+    if matching_tender_ids:
+        matched = index_mask(matching_tender_ids, table)
+        scores = np.where(matched, np.minimum(scores + 10, 100), scores)
+
+    category_pref = company_info.get("category_preference")
+    if category_pref and (code := table["cat_index"].get(category_pref)) is not None:
+        scores = np.where(table["cat_codes"] == code, np.minimum(scores + 10, 100), scores)
+
+    return scores
+
+def band_threshold(band_scores, k):
+    if len(band_scores) <= k:
+        return None
+    return float(np.partition(band_scores, len(band_scores) - k)[len(band_scores) - k])
+
+def passes_threshold(scores, threshold, margin=0.0):
+    if threshold is None:
+        return np.ones(len(scores), dtype=bool)
+    return scores >= threshold - margin
+
+def top_k_positions(scores, low_band, k_low, k_high, margin=0.0):
+    low_threshold = band_threshold(scores[low_band], k_low)
+    high_threshold = band_threshold(scores[~low_band], k_high)
+    keep = np.where(
+        low_band,
+        passes_threshold(scores, low_threshold, margin),
+        passes_threshold(scores, high_threshold, margin)
+    )
+    thresholds = {
+        "low_threshold": low_threshold,
+        "high_threshold": high_threshold,
+        "low_count": int(low_band.sum()),
+        "high_count": int((~low_band).sum()),
+    }
+    return np.flatnonzero(keep), thresholds
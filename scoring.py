@@ -1,17 +1,50 @@
 import json
+import time
+import hashlib
+import numpy as np
+import multiprocessing as mp
 from tqdm import tqdm
 from bson import ObjectId
-from pymongo import InsertOne
+from datetime import datetime
+from pymongo import UpdateOne, DeleteOne
 from collections import Counter
-from config import BATCH_SIZE
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    BATCH_SIZE,
+    MONGO_URI,
+    SCORING_MODE,
+    SCORE_COLLECTION,
+    SHADOW_BATCH_SIZE,
+    SCORE_STORAGE,
+    SCORE_TOP_K_LOW,
+    SCORE_TOP_K_HIGH,
+    SCORE_TOP_K_MARGIN,
+    SCORING_WORKERS,
+    SCORING_WRITERS,
+    KEYWORD_MATCH_BACKEND
+)
 from helpers import (
     collection,
     db_past,
     competitor_collection,
     profile_collection,
     score_collection,
-    haversine
+    score_staging_collection,
+    score_threshold_collection,
+    scoring_state_collection,
+    haversine,
+    connect
+)
+from score_engine import (
+    DEFAULT_MIDPOINT,
+    build_tender_table,
+    score_profile,
+    top_k_positions
 )
+from rescoring import rescore
+from participation import refresh_participation_stats, load_participation_maps
+from keyword_match import resolve_keywords, match_keywords, tender_set_watermark
 
 def get_tenders_matching_keywords(keywords):
     if not keywords:
@@ -161,11 +194,16 @@ def score_small_tender(company_info, tender_info, participation_score):
     total_score = round(tender_amount_fit(), 2) + round(proximity(), 2) + participation_score
     return round(total_score, 1)
 
-def submit_for_scoring():
-    score_collection.drop()
-    print("✅ CompatibilityScores collection dropped.")
-    profiles = list(profile_collection.find({}, {"company_info": 1, "company_name": 1, "user_id": 1}))
-    tenders_cursor = collection.find({}, {"tender_value": 1, "coordinates": 1, "organization": 1, "website": 1, "organization_type": 1})
+def user_object_id(user_id):
+    if isinstance(user_id, str):
+        try:
+            user_id = ObjectId(user_id)
+        except:
+            pass
+    return user_id
+
+def load_tenders():
+    tenders_cursor = collection.find({}, {"tender_value": 1, "coordinates": 1, "organization": 1, "website": 1, "organization_type": 1, "updated_at": 1, "content_changed_at": 1, "geocoded_at": 1})
 
     tenders = []
     for t in tenders_cursor:
@@ -175,81 +213,498 @@ def submit_for_scoring():
             "coordinates": t.get("coordinates"),
             "organization": t.get("organization"),
             "website": t.get("website"),
-            "organization_type": t.get("organization_type", "State")
+            "organization_type": t.get("organization_type", "State"),
+            "updated_at": t.get("updated_at"),
+            "content_changed_at": t.get("content_changed_at"),
+            "geocoded_at": t.get("geocoded_at")
         })
-    print(f"🚀 Preprocessed {len(tenders)} tenders once.")
+    return tenders
 
-    batch_size = BATCH_SIZE
-    ops = []
+def score_tender(company_info, tender, midpoint, participation_scores, matching_tender_ids):
+    tender_value = tender.get("tender_value")
+
+    participation_score_big = (
+        participation_scores.get(tender["organization"], 0)
+        + participation_scores.get(tender["website"], 0)
+    )
+
+    participation_score_small = (
+        participation_scores.get(tender["organization"], 0) / 3
+        + participation_scores.get(tender["website"], 0) / 2
+    )
 
-    for profile in tqdm(profiles, desc="Scoring profiles"):
+    tender_info = {
+        "tender_value": tender_value,
+        "coordinates": tender.get("coordinates"),
+        "organization_type": tender.get("organization_type", "State")
+    }
+
+    if tender_value >= midpoint:
+        score = score_big_tender(company_info, tender_info, participation_score_big)
+    else:
+        score = score_small_tender(company_info, tender_info, participation_score_small)
+
+    if tender["_id"] in matching_tender_ids:
+        score = min(score + 10, 100)
+
+    category_pref = company_info.get("category_preference")
+    tender_category = tender.get("category")
+
+    if category_pref and tender_category:
+        if tender_category == category_pref:
+            score = min(score + 10, 100)
+
+    return score
+
+def check_scoring_parity(max_profiles=20):
+    profiles = list(profile_collection.find({}, {"company_info": 1, "company_name": 1, "user_id": 1}).limit(max_profiles))
+    tenders = [t for t in load_tenders() if t.get("tender_value") is not None]
+    table = build_tender_table(tenders)
+
+    checked, mismatches = 0, 0
+    for profile in tqdm(profiles, desc="Checking parity"):
         company_info = profile.get("company_info")
         if not company_info:
             continue
 
-        company_name = profile.get("company_name")
-        participation_scores = calculate_participation_score(company_name)
+        participation_scores = calculate_participation_score(profile.get("company_name"))
         matching_tender_ids = get_tenders_matching_keywords(company_info.get("keywords", []))
+        midpoint = profile.get("midpoint") or DEFAULT_MIDPOINT
+
+        vector_scores = score_profile(company_info, midpoint, participation_scores, matching_tender_ids, table).tolist()
+        for tender, vector_score in zip(tenders, vector_scores):
+            scalar_score = score_tender(company_info, tender, midpoint, participation_scores, matching_tender_ids)
+            checked += 1
+            if scalar_score != vector_score:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"❌ Mismatch | user={profile.get('user_id')} | tender={tender['_id']} | scalar={scalar_score} | vector={vector_score}")
+
+    print(f"🔎 Parity checked {checked} pairs | Mismatches: {mismatches}")
+    return mismatches == 0
+
+def profile_revision(profile):
+    payload = json.dumps(
+        {"company_info": profile.get("company_info"), "company_name": profile.get("company_name")},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
-        midpoint = profile.get("midpoint") or 500000000
+def participation_revision(profile, participation_maps):
+    if participation_maps is None:
+        return None
+    payload = json.dumps(participation_maps.get(profile.get("company_name"), {}), sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
-        for tender in tenders:
-            tender_value = tender.get("tender_value")
-            if tender_value is None:
-                continue
+def score_one_profile(profile, table, context):
+    company_info = profile.get("company_info")
+    if not company_info:
+        return None
 
-            participation_score_big = (
-                participation_scores.get(tender["organization"], 0)
-                + participation_scores.get(tender["website"], 0)
-            )
+    participation_maps = context.get("participation_maps")
+    keyword_sets = context.get("keyword_sets")
 
-            participation_score_small = (
-                participation_scores.get(tender["organization"], 0) / 3
-                + participation_scores.get(tender["website"], 0) / 2
-            )
+    company_name = profile.get("company_name")
+    if participation_maps is None:
+        participation_scores = calculate_participation_score(company_name)
+    else:
+        participation_scores = participation_maps.get(company_name, {})
 
-            tender_info = {
-                "tender_value": tender_value,
-                "coordinates": tender.get("coordinates"),
-                "organization_type": tender.get("organization_type", "State")
-            }
+    if keyword_sets is None:
+        matching_tender_ids = get_tenders_matching_keywords(company_info.get("keywords", []))
+    else:
+        matching_tender_ids = match_keywords(company_info.get("keywords", []), keyword_sets)
+
+    midpoint = profile.get("midpoint") or DEFAULT_MIDPOINT
+    return score_profile(company_info, midpoint, participation_scores, matching_tender_ids, table)
+
+# Set right before the worker pool forks so children inherit the tender table
+# and lookups copy-on-write instead of receiving them pickled with every task.
+_shared = {}
+# Per worker process; a MongoClient must not be carried across a fork.
+_worker = {}
+
+def can_fork(profiles, context):
+    return (
+        context.get("workers", 1) > 1
+        and len(profiles) > 1
+        and context.get("participation_maps") is not None
+        and context.get("keyword_sets") is not None
+    )
 
-            if tender_value >= midpoint:
-                score = score_big_tender(company_info, tender_info, participation_score_big)
-            else:
-                score = score_small_tender(company_info, tender_info, participation_score_small)
+@contextmanager
+def forked_pool(table, context, **extra):
+    drain_writes(context)
+    _shared.update(
+        table=table,
+        context={k: context.get(k) for k in ("participation_maps", "keyword_sets", "band_midpoints")},
+        **extra
+    )
+    try:
+        with mp.get_context("fork").Pool(context["workers"]) as pool:
+            yield pool
+    finally:
+        _shared.clear()
+
+def _score_shared_profile(profile):
+    return profile, score_one_profile(profile, _shared["table"], _shared["context"])
+
+def _write_shared_profile(profile):
+    table, context = _shared["table"], _shared["context"]
+    scores = score_one_profile(profile, table, context)
+    if scores is None:
+        return None
+
+    if "target" not in _worker:
+        db_name, collection_name = _shared["target"]
+        _worker["target"] = connect(_shared["mongo_uri"])[db_name][collection_name]
+    user_id = user_object_id(profile["user_id"])
+    positions, thresholds = kept_positions(profile, scores, table, context["band_midpoints"])
+    for docs in score_docs(table["ids"], user_id, scores, positions, _shared["batch_size"]):
+        _worker["target"].insert_many(docs, ordered=False)
+    return None if thresholds is None else {"user_id": user_id, **thresholds}
+
+def iter_profile_scores(profiles, table, context, desc="Scoring profiles"):
+    if can_fork(profiles, context):
+        with forked_pool(table, context) as pool:
+            results = pool.imap_unordered(_score_shared_profile, profiles)
+            for profile, scores in tqdm(results, total=len(profiles), desc=f"{desc} ({context['workers']} workers)"):
+                if scores is None:
+                    continue
+                yield profile, user_object_id(profile["user_id"]), scores
+        return
+
+    for profile in tqdm(profiles, desc=desc):
+        scores = score_one_profile(profile, table, context)
+        if scores is None:
+            continue
+        yield profile, user_object_id(profile["user_id"]), scores
+
+def submit_write(context, fn, *args, **kwargs):
+    writer = context.get("writer")
+    if writer is None:
+        fn(*args, **kwargs)
+        return
+
+    pending = context["pending"]
+    pending.append(writer.submit(fn, *args, **kwargs))
+    if len(pending) >= context.get("writers", SCORING_WRITERS) * 2:
+        pending.pop(0).result()
+
+def drain_writes(context):
+    pending = context.get("pending") or []
+    while pending:
+        pending.pop(0).result()
+
+def flush_score_ops(ops, context, force=False):
+    if ops and (force or len(ops) >= BATCH_SIZE):
+        submit_write(context, score_collection.bulk_write, list(ops), ordered=False)
+        ops.clear()
+
+def load_band_midpoints(storage=SCORE_STORAGE):
+    if storage != "topk":
+        return None
+    return {
+        p["_id"]: p.get("midpoint") or DEFAULT_MIDPOINT
+        for p in profile_collection.find({}, {"midpoint": 1})
+    }
+
+def kept_positions(profile, scores, table, band_midpoints):
+    if band_midpoints is None:
+        return range(table["size"]), None
+    low_band = table["value"] < band_midpoints.get(profile["_id"], DEFAULT_MIDPOINT)
+    positions, thresholds = top_k_positions(scores, low_band, SCORE_TOP_K_LOW, SCORE_TOP_K_HIGH, SCORE_TOP_K_MARGIN)
+    return positions.tolist(), thresholds
+
+def score_docs(ids, user_id, scores, positions, batch_size):
+    # Highest scores first, so each batch lands in (user_id, score) index order.
+    positions = np.asarray(positions, dtype=np.int64)
+    order = positions[np.argsort(-scores[positions], kind="stable")]
+    docs = []
+    for i, score in zip(order.tolist(), scores[order].tolist()):
+        docs.append({"tender_id": ids[i], "user_id": user_id, "score": score})
+        if len(docs) >= batch_size:
+            yield docs
+            docs = []
+    if docs:
+        yield docs
+
+def write_profile_scores(profiles, table, context, target, batch_size, desc="Scoring profiles"):
+    threshold_docs = []
+    if context.get("mongo_uri") and can_fork(profiles, context):
+        # Every worker opens its own client and inserts its own profiles'
+        # rows, so the parent never builds or encodes per-pair documents.
+        with forked_pool(
+            table,
+            context,
+            target=(target.database.name, target.name),
+            mongo_uri=context["mongo_uri"],
+            batch_size=batch_size
+        ) as pool:
+            results = pool.imap_unordered(_write_shared_profile, profiles)
+            for thresholds in tqdm(results, total=len(profiles), desc=f"{desc} ({context['workers']} workers)"):
+                if thresholds is not None:
+                    threshold_docs.append(thresholds)
+        return threshold_docs
+
+    for profile, user_id, scores in iter_profile_scores(profiles, table, context, desc=desc):
+        positions, thresholds = kept_positions(profile, scores, table, context.get("band_midpoints"))
+        if thresholds is not None:
+            threshold_docs.append({"user_id": user_id, **thresholds})
+        for docs in score_docs(table["ids"], user_id, scores, positions, batch_size):
+            submit_write(context, target.insert_many, docs, ordered=False)
+    drain_writes(context)
+    return threshold_docs
+
+def save_score_thresholds(threshold_docs, replace=False):
+    if replace:
+        score_threshold_collection.delete_many({})
+    if not threshold_docs:
+        return
+    score_threshold_collection.bulk_write([
+        UpdateOne({"user_id": doc["user_id"]}, {"$set": doc}, upsert=True)
+        for doc in threshold_docs
+    ], ordered=False)
+    score_threshold_collection.create_index([("user_id", 1)], unique=True)
+    print(f"📏 Saved top-K thresholds for {len(threshold_docs)} users.")
+
+def create_score_indexes(target=None):
+    target = score_collection if target is None else target
+    target.create_index([("user_id", 1), ("score", -1)])
+    target.create_index([("tender_id", 1), ("user_id", 1)], unique=True)
+    target.create_index([("base_score", 1)], sparse=True)
+    print("✅ Indexes created successfully.")
 
-            if tender["_id"] in matching_tender_ids:
-                score = min(score + 10, 100)
+def revert_rescore_boosts():
+    result = score_collection.update_many(
+        {"base_score": {"$exists": True}},
+        [{"$set": {"score": "$base_score"}}, {"$unset": "base_score"}]
+    )
+    print(f"↩️ Reverted rescore boosts on {result.modified_count} scores.")
+
+def save_scoring_state(profiles, tenders, participation_maps, scored_at):
+    # scored_at is when this run read the tenders; anything geocoded after it
+    # is picked up by the next incremental run.
+    watermark = max((t["updated_at"] for t in tenders if t.get("updated_at")), default=None)
+    last_tender_id = max((t["_id"] for t in tenders), default=None)
+    ops = [UpdateOne(
+        {"_id": "tenders"},
+        {"$set": {"watermark": watermark, "last_tender_id": last_tender_id, "scored_at": scored_at}},
+        upsert=True
+    )]
+    for profile in profiles:
+        ops.append(UpdateOne(
+            {"_id": profile["_id"]},
+            {"$set": {
+                "revision": profile_revision(profile),
+                "participation": participation_revision(profile, participation_maps),
+                "user_id": user_object_id(profile.get("user_id"))
+            }},
+            upsert=True
+        ))
+    scoring_state_collection.bulk_write(ops, ordered=False)
+    scoring_state_collection.delete_many({"_id": {"$nin": ["tenders"] + [p["_id"] for p in profiles]}})
+    print(f"🕒 Scoring watermark saved: {watermark}")
+
+def full_scoring(profiles, table, context):
+    band_midpoints = context.get("band_midpoints")
+    score_collection.drop()
+    print("✅ CompatibilityScores collection dropped.")
 
-            category_pref = company_info.get("category_preference")
-            tender_category = tender.get("category")
+    threshold_docs = write_profile_scores(profiles, table, context, score_collection, BATCH_SIZE)
 
-            if category_pref and tender_category:
-                if tender_category == category_pref:
-                    score = min(score + 10, 100)
+    print("✅ Scoring completed and stored successfully.")
+    create_score_indexes()
+    if band_midpoints is not None:
+        save_score_thresholds(threshold_docs, replace=True)
+
+def incremental_scoring(profiles, tenders, table, context):
+    band_midpoints = context.get("band_midpoints")
+    state = scoring_state_collection.find_one({"_id": "tenders"})
+    if not state or score_collection.estimated_document_count() == 0:
+        print("⚠️ No scoring watermark found — running a full rebuild.")
+        return full_scoring(profiles, table, context)
+
+    watermark = state.get("watermark")
+    last_tender_id = state.get("last_tender_id")
+    scored_at = state.get("scored_at")
+    print(f"🕒 Last scoring watermark: {watermark}")
+    create_score_indexes()
+    revert_rescore_boosts()
+    if band_midpoints is not None:
+        return incremental_topk_scoring(profiles, table, context)
+
+    scored_ids = set(score_collection.distinct("tender_id"))
+    deleted_ids = list(scored_ids - set(table["id_index"]))
+    deleted_count = 0
+    for i in range(0, len(deleted_ids), BATCH_SIZE):
+        result = score_collection.delete_many({"tender_id": {"$in": deleted_ids[i:i + BATCH_SIZE]}})
+        deleted_count += result.deleted_count
+    print(f"🗑️ Removed {deleted_count} scores for {len(deleted_ids)} deleted tenders.")
+
+    def is_new(t):
+        if last_tender_id is None:
+            return t["_id"] not in scored_ids
+        return t["_id"] > last_tender_id
+
+    def changed_since(t, field):
+        return scored_at is not None and t.get(field) is not None and t[field] > scored_at
+
+    def is_changed(t):
+        # The scraper's updated_at moves on every crawl, so upsertion stamps
+        # content_changed_at only when the content hash differs. Tenders
+        # written before that stamp existed fall back to updated_at.
+        if t.get("content_changed_at") is None:
+            return watermark is None or t.get("updated_at") is None or t["updated_at"] > watermark
+        return scored_at is None or changed_since(t, "content_changed_at")
+
+    changed_tenders = [
+        t for t in tenders
+        if is_new(t)
+        or is_changed(t)
+        # process_coordinates fills coordinates without touching the content.
+        or changed_since(t, "geocoded_at")
+    ]
+    changed_table = build_tender_table(changed_tenders)
+
+    # Participation stats are rebuilt from Results every run; a profile whose
+    # map moved is rescored against every tender, like an edited profile.
+    participation_maps = context.get("participation_maps")
+    previous = {d["_id"]: d for d in scoring_state_collection.find({"_id": {"$ne": "tenders"}})}
+    changed_profiles, stable_profiles = [], []
+    for profile in profiles:
+        state_doc = previous.pop(profile["_id"], None)
+        if (
+            state_doc
+            and state_doc.get("revision") == profile_revision(profile)
+            and state_doc.get("participation") == participation_revision(profile, participation_maps)
+        ):
+            stable_profiles.append(profile)
+        else:
+            changed_profiles.append(profile)
 
-            user_id = profile["user_id"]
-            if isinstance(user_id, str):
-                try:
-                    user_id = ObjectId(user_id)
-                except:
-                    pass
+    print(f"🆕 New/changed tenders: {changed_table['size']} | Changed profiles: {len(changed_profiles)} | Removed profiles: {len(previous)}")
 
-            ops.append(InsertOne({
-                "tender_id": tender["_id"],
-                "user_id": user_id,
-                "score": score
-            }))
+    for state_doc in previous.values():
+        score_collection.delete_many({"user_id": state_doc.get("user_id")})
+        score_threshold_collection.delete_many({"user_id": state_doc.get("user_id")})
+    for profile in changed_profiles:
+        score_collection.delete_many({"user_id": user_object_id(profile.get("user_id"))})
 
-            if len(ops) >= batch_size:
-                score_collection.bulk_write(ops, ordered=False)
-                ops.clear()
+    write_profile_scores(changed_profiles, table, context, score_collection, BATCH_SIZE, desc="Scoring changed profiles")
+
+    ops = []
+    if changed_table["size"]:
+        changed_ids = changed_table["ids"]
+        for profile, user_id, scores in iter_profile_scores(stable_profiles, changed_table, context, desc="Scoring changed tenders"):
+            score_values = scores.tolist()
+            for i, tender_id in enumerate(changed_ids):
+                ops.append(UpdateOne(
+                    {"tender_id": tender_id, "user_id": user_id},
+                    {"$set": {"score": score_values[i]}},
+                    upsert=True
+                ))
+                flush_score_ops(ops, context)
+    flush_score_ops(ops, context, force=True)
+    drain_writes(context)
+
+    print("✅ Incremental scoring completed and stored successfully.")
+
+def incremental_topk_scoring(profiles, table, context):
+    # A user's top K depends on every tender, so patching stored rows against
+    # last run's thresholds drifts as tenders are added, edited or removed.
+    # Scoring in memory is cheap; every profile is rescored against the full
+    # table and only the difference to what is stored gets written.
+    band_midpoints = context["band_midpoints"]
+    stored = {}
+    for doc in score_collection.find({}, {"tender_id": 1, "user_id": 1, "score": 1}):
+        stored.setdefault(doc["user_id"], {})[doc["tender_id"]] = doc["score"]
+
+    ids = table["ids"]
+    ops = []
+    threshold_docs = []
+    upserted, deleted = 0, 0
+    for profile, user_id, scores in iter_profile_scores(profiles, table, context):
+        positions, thresholds = kept_positions(profile, scores, table, band_midpoints)
+        threshold_docs.append({"user_id": user_id, **thresholds})
+
+        previous = stored.pop(user_id, {})
+        score_values = scores.tolist()
+        for i in positions:
+            tender_id, score = ids[i], score_values[i]
+            if previous.pop(tender_id, None) != score:
+                ops.append(UpdateOne(
+                    {"tender_id": tender_id, "user_id": user_id},
+                    {"$set": {"score": score}},
+                    upsert=True
+                ))
+                upserted += 1
+                flush_score_ops(ops, context)
+        for tender_id in previous:
+            ops.append(DeleteOne({"tender_id": tender_id, "user_id": user_id}))
+            deleted += 1
+            flush_score_ops(ops, context)
+    flush_score_ops(ops, context, force=True)
+    drain_writes(context)
+
+    # Users left over were removed or lost their company_info.
+    for user_id in stored:
+        score_collection.delete_many({"user_id": user_id})
+    print(f"🔁 Top-K diff: {upserted} upserted | {deleted} dropped | {len(stored)} users removed")
+
+    save_score_thresholds(threshold_docs, replace=True)
+    print("✅ Incremental scoring completed and stored successfully.")
+
+def shadow_scoring(profiles, table, context):
+    band_midpoints = context.get("band_midpoints")
+    score_staging_collection.drop()
+    print(f"✅ Staging collection {score_staging_collection.name} reset.")
+
+    threshold_docs = write_profile_scores(profiles, table, context, score_staging_collection, SHADOW_BATCH_SIZE)
+
+    print("✅ Scoring completed and stored in staging.")
+    create_score_indexes(score_staging_collection)
+
+    print("🔁 Applying saved-tender boosts to staging...")
+    rescore(score_staging_collection)
+
+    score_staging_collection.rename(SCORE_COLLECTION, dropTarget=True)
+    print(f"🔀 Swapped {score_staging_collection.name} over {SCORE_COLLECTION}.")
+    if band_midpoints is not None:
+        save_score_thresholds(threshold_docs, replace=True)
+
+def submit_for_scoring(mode=SCORING_MODE, storage=SCORE_STORAGE, workers=SCORING_WORKERS, writers=SCORING_WRITERS, keyword_backend=KEYWORD_MATCH_BACKEND, mongo_uri=MONGO_URI):
+    scored_at = datetime.now()
+    profiles = list(profile_collection.find({}, {"company_info": 1, "company_name": 1, "user_id": 1}))
+    tenders = [t for t in load_tenders() if t.get("tender_value") is not None]
+    table = build_tender_table(tenders)
+    print(f"🚀 Preprocessed {table['size']} tenders once. | Storage: {storage}")
+
+    company_names = sorted({p["company_name"] for p in profiles if p.get("company_name")})
+    refresh_participation_stats(company_names)
+    context = {
+        "band_midpoints": load_band_midpoints(storage),
+        "participation_maps": load_participation_maps(company_names),
+        "keyword_sets": resolve_keywords(profiles, tender_set_watermark(tenders), keyword_backend),
+        "workers": workers,
+        "writers": writers,
+        "mongo_uri": mongo_uri,
+        "pending": [],
+    }
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(writers, 1)) as writer:
+        context["writer"] = writer if writers > 1 else None
+
+        if mode == "incremental":
+            incremental_scoring(profiles, tenders, table, context)
+        elif mode == "shadow":
+            shadow_scoring(profiles, table, context)
+        else:
+            full_scoring(profiles, table, context)
+        drain_writes(context)
 
-    if ops:
-        score_collection.bulk_write(ops, ordered=False)
+    print(f"⏱ Scoring stage: {time.time() - start:.2f}s | Workers: {workers} | Writers: {writers}")
 
-    print("✅ Scoring completed and stored successfully.")
-    score_collection.create_index([("user_id", 1), ("score", -1)])
-    score_collection.create_index([("tender_id", 1), ("user_id", 1)], unique=True)
-    print("✅ Indexes created successfully.")
+    save_scoring_state(profiles, tenders, context["participation_maps"], scored_at)
@@ -0,0 +1,48 @@
+import pytest
+from scoring import score_tender
+from score_engine import DEFAULT_MIDPOINT, build_tender_table, score_profile
+from participation import participation_from_stats
+from keyword_match import match_keywords
+from benchmark_scoring import generate_tenders, generate_profiles, generate_participation, synthetic_keyword_sets
+
+@pytest.fixture(scope="module")
+def synthetic():
+    tenders, orgs, sites = generate_tenders(3000, seed=21)
+    profiles = generate_profiles(40, seed=23)
+
+    # Edge cases the generators never produce on their own.
+    profiles.append({"company_name": "No sites", "company_info": {"preferred_tender_amount_range": [0, 0], "keywords": []}})
+    profiles.append({"company_name": "Inverted range", "company_info": {
+        "hq_locations": [{"coordinates": [19.07, 72.87]}, {"coordinates": None}],
+        "preferred_tender_amount_range": [900000000, 100000000],
+    }, "midpoint": 25000000})
+    tenders.append(dict(tenders[0], _id="midpoint", tender_value=float(DEFAULT_MIDPOINT)))
+
+    for i, t in enumerate(tenders):
+        t["category"] = ["Works", "Goods", None][i % 3]
+    profiles[0]["company_info"]["category_preference"] = "Works"
+
+    stats = generate_participation(profiles, orgs, sites, seed=29)
+    maps = {s["name"]: participation_from_stats(s) for s in stats}
+    return tenders, profiles, maps, synthetic_keyword_sets(tenders)
+
+def test_vectorized_scores_match_scalar_scores(synthetic):
+    tenders, profiles, maps, keyword_sets = synthetic
+    rows = [t for t in tenders if t.get("tender_value") is not None]
+    table = build_tender_table(tenders)
+    assert table["ids"] == [t["_id"] for t in rows]
+
+    mismatches = []
+    for profile in profiles:
+        company_info = profile["company_info"]
+        participation_scores = maps.get(profile["company_name"], {})
+        matching = match_keywords(company_info.get("keywords"), keyword_sets)
+        midpoint = profile.get("midpoint") or DEFAULT_MIDPOINT
+
+        vector_scores = score_profile(company_info, midpoint, participation_scores, matching, table).tolist()
+        for tender, vector_score in zip(rows, vector_scores):
+            scalar_score = score_tender(company_info, tender, midpoint, participation_scores, matching)
+            if scalar_score != vector_score:
+                mismatches.append((profile["company_name"], tender["_id"], scalar_score, vector_score))
+
+    assert mismatches == []
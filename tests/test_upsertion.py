@@ -0,0 +1,66 @@
+import mongomock
+import pytest
+from datetime import datetime, timedelta
+import upsertion
+import postprocessing
+from ingest import content_hash
+
+@pytest.fixture
+def tenders(monkeypatch):
+    collection = mongomock.MongoClient().db.Tenders
+    monkeypatch.setattr(upsertion, "collection", collection)
+    monkeypatch.setattr(postprocessing, "collection", collection)
+    return collection
+
+def enriched_record(unique_id, published_date, updated_at):
+    record = {
+        "unique_identifier": unique_id,
+        "description": f"Tender {unique_id}",
+        "tender_value": 1000000.0,
+        "published_date": published_date,
+        "corrigendum_date": None,
+        "updated_at": updated_at,
+    }
+    record["content_hash"] = content_hash(record)
+    return record
+
+def test_content_hash_ignores_scraper_updated_at():
+    published = datetime(2026, 1, 5, 10, 30)
+    first = enriched_record("A", published, datetime(2026, 1, 5, 11))
+    second = enriched_record("A", published, datetime(2026, 1, 6, 9))
+    assert first["content_hash"] == second["content_hash"]
+    assert enriched_record("B", published, published)["content_hash"] != first["content_hash"]
+
+def test_unchanged_tender_is_reclamped_like_a_full_rewrite(tenders):
+    now = datetime.now().replace(microsecond=0)
+    future = now + timedelta(days=3)
+    record = enriched_record("A", future, now - timedelta(hours=1))
+
+    assert upsertion.write_records([record])["inserted"] == 1
+    postprocessing.postprocessing()
+    clamped = tenders.find_one({"unique_identifier": "A"})
+    assert clamped["published_date"] < future
+
+    # Next day's crawl has the same content: no full rewrite, but the raw
+    # dates come back so postprocessing clamps to that night again.
+    stats = upsertion.write_records([record])
+    assert (stats["written"], stats["unchanged"], stats["dates_refreshed"]) == (0, 1, 1)
+    assert tenders.find_one({"unique_identifier": "A"})["published_date"] == future
+    postprocessing.postprocessing()
+    assert tenders.find_one({"unique_identifier": "A"})["published_date"] == clamped["published_date"]
+
+def test_identical_tender_is_not_written(tenders):
+    record = enriched_record("A", datetime(2026, 1, 5, 10, 30), datetime(2026, 1, 5, 11))
+    upsertion.write_records([record])
+    ops, unchanged, refreshed = upsertion.changed_ops([dict(record)])
+    assert (ops, unchanged, refreshed) == ([], 1, 0)
+
+def test_past_dated_tender_is_not_rewritten_after_postprocessing(tenders):
+    now = datetime.now().replace(microsecond=0)
+    record = enriched_record("A", now - timedelta(days=2), now - timedelta(hours=1))
+
+    upsertion.write_records([record])
+    postprocessing.postprocessing()
+    stats = upsertion.write_records([dict(record)])
+    assert (stats["written"], stats["unchanged"], stats["dates_refreshed"]) == (0, 1, 0)
+    assert upsertion.changed_ops([dict(record)]) == ([], 1, 0)
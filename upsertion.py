@@ -1,134 +1,180 @@
+import os
 import json
+import time
 from tqdm import tqdm
-from dateutil import parser
 from datetime import datetime
 from pymongo import UpdateOne
-from config import STATE_URLS
+from concurrent.futures import ThreadPoolExecutor
 from helpers import collection 
-from config import JSONL_FILE, BATCH_SIZE
+from config import JSONL_FILE, BATCH_SIZE, UPSERT_WRITERS, UPSERT_CHECKPOINT_FILE
+from ingest import load_manifest, iter_records, source_signature
 
-def parse_iso_date(date_str):
-    if not date_str or str(date_str).strip() == "":
-        return None
-    try:
-        dt = datetime.strptime(date_str, "%d-%b-%Y %I:%M %p")
-        return dt
-    except:
-        try:
-            dt = parser.parse(date_str)
-            return dt.replace(tzinfo=None)
-        except:
-            return None
-
-def enrich_tender_data(tender):
-    work_item = tender.get("WorkItemDetails", {})
-    basic_details = tender.get("BasicDetails", {})
-    emd_details = tender.get("EmdFeeDetails", {})
-    critical_dates = tender.get("CriticalDates", {})
-    corrigendums = tender.get("Corrigenda") or []
-
-    website = (tender.get("Website") or "").lower()
-    organization_type = "Central"
-    state_name = ""
-
-    for state, url in STATE_URLS.items():
-        if url.lower() in website:
-            organization_type = "State"
-            state_name = state
-            break
-
-    latest_corrigendum_date = None
-    for c in corrigendums:
-        details = c.get("Details") or []
-        for d in details:
-            dt = parse_iso_date(d.get("PublishedDate", ""))
-            if dt and (latest_corrigendum_date is None or dt > latest_corrigendum_date):
-                latest_corrigendum_date = dt
-
-    def safe_float(val):
-        try:
-            return round(float(val or 0), 2)
-        except:
-            return 0.0
-
-    enriched = {
-        "unique_identifier": tender.get("UniqueIdentifier", ""),
-        "updated_at": parse_iso_date(tender.get("UpdatedAt", "")),
-        "website": tender.get("Website", ""),
-        "link": tender.get("Link", ""),
-        "description": work_item.get("Title", ""),
-        "work_description": work_item.get("Description", ""),
-        "tender_value": safe_float(work_item.get("TenderValue", 0)),
-        "emd": safe_float(emd_details.get("EmdAmount", 0)),
-        "published_date": parse_iso_date(critical_dates.get("PublishedDate", "")),
-        "corrigendum_date": latest_corrigendum_date,
-        "submission_date": parse_iso_date(critical_dates.get("BidSubmissionEndDate", "")),
-        "organization": basic_details.get("OrganisationChain", "").split("||")[0],
-        "organization_type": organization_type,
-        "state": state_name,
-        "organization_tender_id": basic_details.get("TenderID", ""),
-        "type": basic_details.get("FormOfContract", ""),
-        "category": basic_details.get("TenderCategory", ""),
-        "product_category": work_item.get("ProductCategory", ""),
-        "product_sub_category": work_item.get("SubCategory", ""),
-        "completion_period": safe_float(work_item.get("PeriodOfWorkDays", 0)),
-        "corrigendums": corrigendums
-    }
-
-    return enriched
+# Postprocessing clamps future dates to tonight, so a hash-skipped tender
+# whose raw date is still ahead gets it re-set and is clamped again, as a full
+# rewrite would. Past dates are left as they are, so they match the stored
+# value and cost nothing; updated_at is recomputed by postprocessing anyway.
+DATE_FIELDS = ("published_date", "corrigendum_date")
 
-def upsertion(file_path = JSONL_FILE, batch_size = BATCH_SIZE):
-    batch_ops = []
-    total_inserted = 0
-    total_upserted = 0
-    total_lines = 0
+def stored_hashes(unique_ids):
+    cursor = collection.find(
+        {"unique_identifier": {"$in": list(unique_ids)}},
+        {"unique_identifier": 1, "content_hash": 1, **{field: 1 for field in DATE_FIELDS}}
+    )
+    return {d["unique_identifier"]: d for d in cursor}
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        for line in tqdm(f, desc="Reading JSONL"):
-            total_lines += 1
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                tender = json.loads(line)
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Skipping invalid JSON line {total_lines}: {e}")
-                continue
+def same_date(stored, value):
+    # Mongo keeps milliseconds only.
+    if stored is None or value is None:
+        return stored is value
+    return stored == value.replace(microsecond=value.microsecond // 1000 * 1000)
 
-            enriched = enrich_tender_data(tender)
-            unique_id = enriched.get("unique_identifier")
+def changed_ops(records):
+    # One $in lookup per batch; a tender whose stored hash matches its
+    # enriched record is left alone instead of being rewritten in full.
+    existing = stored_hashes({r["unique_identifier"] for r in records if r.get("unique_identifier")})
+    batch_ops, unchanged, refreshed = [], 0, 0
+    # Unlike the scraper's updated_at, this only moves when the content does;
+    # incremental scoring watermarks on it.
+    changed_at = datetime.now()
+    for enriched in records:
+        unique_id = enriched.get("unique_identifier")
 
-            if unique_id:
-                batch_ops.append(
-                    UpdateOne(
-                        {"unique_identifier": unique_id},
-                        {"$set": enriched},
-                        upsert=True
-                    )
+        if unique_id:
+            stored = existing.get(unique_id)
+            if stored and stored.get("content_hash") == enriched["content_hash"]:
+                unchanged += 1
+                dates = {field: enriched[field] for field in DATE_FIELDS if not same_date(stored.get(field), enriched[field])}
+                if dates:
+                    refreshed += 1
+                    batch_ops.append(UpdateOne({"unique_identifier": unique_id}, {"$set": dates}))
+                continue
+            batch_ops.append(
+                UpdateOne(
+                    {"unique_identifier": unique_id},
+                    {"$set": {**enriched, "content_changed_at": changed_at}},
+                    upsert=True
                 )
-            else:
-                batch_ops.append(
-                    UpdateOne(
-                        {"_id": None},
-                        {"$setOnInsert": enriched},
-                        upsert=True
-                    )
+            )
+        else:
+            batch_ops.append(
+                UpdateOne(
+                    {"_id": None},
+                    {"$setOnInsert": {**enriched, "content_changed_at": changed_at}},
+                    upsert=True
                 )
+            )
+    return batch_ops, unchanged, refreshed
 
-            if len(batch_ops) >= batch_size:
-                result = collection.bulk_write(batch_ops, ordered=False)
-                total_inserted += result.upserted_count
-                total_upserted += result.matched_count
-                print(f"🧩 Processed batch of {len(batch_ops)} | Inserted: {total_inserted} | Upserted: {total_upserted}")
-                batch_ops = []
-
+def write_records(records):
+    batch_ops, unchanged, refreshed = changed_ops(records)
+    inserted = upserted = 0
     if batch_ops:
         result = collection.bulk_write(batch_ops, ordered=False)
-        total_inserted += result.upserted_count
-        total_upserted += result.matched_count
-        print(f"🧩 Processed final batch of {len(batch_ops)} | Inserted: {total_inserted} | Upserted: {total_upserted}")
+        inserted, upserted = result.upserted_count, result.matched_count - refreshed
+    return {
+        "records": len(records),
+        "written": len(batch_ops) - refreshed,
+        "inserted": inserted,
+        "upserted": upserted,
+        "unchanged": unchanged,
+        "dates_refreshed": refreshed
+    }
+
+def checkpoint_signature(file_path, manifest):
+    # Offsets point into the records file, so a rebuilt manifest (same JSONL,
+    # possibly a different record order) must not reuse them.
+    stat = os.stat(manifest["records_file"])
+    return list(source_signature(file_path)) + [manifest.get("build_id"), stat.st_size, stat.st_mtime_ns]
+
+def load_upsert_checkpoint(signature, path=UPSERT_CHECKPOINT_FILE):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("signature") != list(signature):
+        print("♻️ Upsert checkpoint belongs to another manifest build — starting over.")
+        return None
+    return checkpoint
+
+def save_upsert_checkpoint(checkpoint, path=UPSERT_CHECKPOINT_FILE):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def clear_upsert_checkpoint(path=UPSERT_CHECKPOINT_FILE):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def upsertion(file_path = JSONL_FILE, batch_size = BATCH_SIZE, writers = UPSERT_WRITERS):
+    manifest = load_manifest(file_path)
+    total_lines = manifest["total_lines"]
+    signature = checkpoint_signature(file_path, manifest)
+
+    # The checkpoint is the manifest byte offset after the last batch whose
+    # write was acknowledged, along with every batch before it.
+    checkpoint = load_upsert_checkpoint(signature)
+    totals = {"records": 0, "written": 0, "inserted": 0, "upserted": 0, "unchanged": 0, "dates_refreshed": 0}
+    start_offset = 0
+    if checkpoint:
+        start_offset = checkpoint["offset"]
+        totals.update(checkpoint["totals"])
+        print(f"⏩ Resuming upsert after {totals['records']} tenders (offset {start_offset})")
+    resumed_records = totals["records"]
+
+    start = time.time()
+    pending = []
+
+    def acknowledge():
+        future, end_offset, _ = pending.pop(0)
+        stats = future.result()
+        for key, value in stats.items():
+            totals[key] += value
+        rate = (totals["records"] - resumed_records) / max(time.time() - start, 1e-9)
+        print(f"🧩 Processed batch of {stats['records']} | Written: {stats['written']} | Inserted: {totals['inserted']} | Upserted: {totals['upserted']} | Unchanged: {totals['unchanged']} | {rate:,.0f} docs/sec")
+        save_upsert_checkpoint({
+            "signature": signature,
+            "offset": end_offset,
+            "totals": totals,
+            "updated_at": datetime.now().isoformat(),
+        })
+
+    def submit(records, end_offset):
+        # A tender repeated in the snapshot must not race an earlier copy
+        # still in flight; wait those writes out so the last line still wins.
+        unique_ids = {r["unique_identifier"] for r in records if r.get("unique_identifier")}
+        while any(not unique_ids.isdisjoint(ids) for _, _, ids in pending):
+            acknowledge()
+        pending.append((executor.submit(write_records, records), end_offset, unique_ids))
+
+    with ThreadPoolExecutor(max_workers=max(writers, 1)) as executor:
+        records = []
+        remaining = manifest["records"] - resumed_records
+        for enriched, end_offset in tqdm(iter_records(manifest, start_offset, with_offsets=True), total=remaining, desc="Upserting manifest"):
+            records.append(enriched)
+            if len(records) >= batch_size:
+                submit(records, end_offset)
+                records = []
+                # Batches are acknowledged in submission order, so the saved
+                # offset only ever covers a contiguous prefix of the manifest.
+                if len(pending) >= max(writers, 1) * 2:
+                    acknowledge()
+
+        if records:
+            submit(records, end_offset)
+        while pending:
+            acknowledge()
+
+    clear_upsert_checkpoint()
+    elapsed = time.time() - start
+    processed = totals["records"] - resumed_records
 
     print("\n✅ Upsert/Insert Completed!")
     print(f"📄 Total tenders in JSONL: {total_lines}")
-    print(f"📊 Total inserted (new docs): {total_inserted}")
-    print(f"📊 Total upserted/updated: {total_upserted}")
+    print(f"📊 Total inserted (new docs): {totals['inserted']}")
+    print(f"📊 Total upserted/updated: {totals['upserted']}")
+    print(f"📊 Total unchanged (skipped): {totals['unchanged']} | Dates re-set: {totals['dates_refreshed']}")
+    print(f"⏱ Sustained throughput: {processed} tenders in {elapsed:.2f}s → {processed / max(elapsed, 1e-9):,.0f} docs/sec")
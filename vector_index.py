@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import numpy as np
+from tqdm import tqdm
+from bson import ObjectId
+from datetime import datetime
+from config import VECTOR_INDEX_DIR, VECTOR_INDEX_DTYPE, VECTOR_INDEX_CHUNK_ROWS, VECTOR_QUERY_BATCH
+from helpers import embedding_collection
+from embedding_codec import EMBEDDING_PROJECTION, decode_embedding
+
+EXPORT_BATCH = 1024
+
+def index_path(index_dir, name):
+    return os.path.join(index_dir, name)
+
+def read_meta(index_dir):
+    path = index_path(index_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+def save_index_file(index_dir, name, write):
+    # Written beside the target and renamed over it, so a crash never leaves
+    # a half-written ids/live/meta file behind.
+    path = index_path(index_dir, name)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+def refresh_vector_index(index_dir=VECTOR_INDEX_DIR, dtype=VECTOR_INDEX_DTYPE, rebuild=False):
+    os.makedirs(index_dir, exist_ok=True)
+    meta = None if rebuild else read_meta(index_dir)
+    if meta and meta.get("dtype") != dtype:
+        print(f"♻️ Vector index dtype changed ({meta.get('dtype')} → {dtype}) — rebuilding.")
+        meta = None
+
+    matrix_path = index_path(index_dir, "matrix.bin")
+    if meta is None:
+        if os.path.exists(matrix_path):
+            os.remove(matrix_path)
+        ids, dim, last_id, embedded_after = [], None, None, None
+    else:
+        # meta.json is written last; anything past its count is from a run
+        # that died before committing.
+        ids = np.load(index_path(index_dir, "ids.npy"))[:meta["count"]].tolist()
+        dim = meta["dim"]
+        last_id = ObjectId(meta["last_id"]) if meta.get("last_id") else None
+        embedded_after = datetime.fromisoformat(meta["embedded_after"]) if meta.get("embedded_after") else None
+
+    start = time.time()
+    started_at = datetime.now()
+    existing = len(ids)
+    # New documents come after last_id; documents re-embedded in place keep
+    # their _id and are found through embedded_at instead.
+    embedding_collection.create_index([("embedded_at", 1)], sparse=True)
+    query = {}
+    if last_id is not None:
+        query = {"_id": {"$gt": last_id}}
+        if embedded_after is not None:
+            query = {"$or": [query, {"embedded_at": {"$gt": embedded_after}}]}
+    cursor = embedding_collection.find(query, EMBEDDING_PROJECTION).sort("_id", 1)
+
+    buffer_ids, buffer_vecs = [], []
+
+    def flush(f):
+        if not buffer_vecs:
+            return
+        f.write(normalize_rows(buffer_vecs).astype(dtype).tobytes())
+        ids.extend(buffer_ids)
+        buffer_ids.clear()
+        buffer_vecs.clear()
+
+    with open(matrix_path, "ab") as f:
+        # Drop rows appended by an interrupted run that never saved its ids.
+        f.truncate(existing * dim * np.dtype(dtype).itemsize if dim else 0)
+        for doc in tqdm(cursor, desc="Exporting embeddings"):
+            if last_id is None or doc["_id"] > last_id:
+                last_id = doc["_id"]
+            vec = decode_embedding(doc)
+            if not vec:
+                continue
+            if dim is None:
+                dim = len(vec)
+            if len(vec) != dim:
+                print(f"⚠️ Skipping embedding for {doc.get('tender_id')} with {len(vec)} dims (index has {dim})")
+                continue
+            buffer_ids.append(doc["tender_id"])
+            buffer_vecs.append(vec)
+            if len(buffer_vecs) >= EXPORT_BATCH:
+                flush(f)
+        flush(f)
+
+    # Rows are append-only: a row stays live while its tender still has an
+    # embedding and no newer row for the same tender was exported after it.
+    latest = {tid: i for i, tid in enumerate(ids)}
+    current = {d["tender_id"] for d in embedding_collection.find({}, {"tender_id": 1, "_id": 0}) if "tender_id" in d}
+    live = np.fromiter((latest[tid] == i and tid in current for i, tid in enumerate(ids)), dtype=bool, count=len(ids))
+    added = len(ids) - existing
+
+    save_index_file(index_dir, "ids.npy", lambda f: np.save(f, np.array(ids, dtype=str)))
+    save_index_file(index_dir, "live.npy", lambda f: np.save(f, live))
+    meta = {
+        "count": len(ids),
+        "dim": dim,
+        "dtype": dtype,
+        "last_id": str(last_id) if last_id else None,
+        "embedded_after": started_at.isoformat(),
+        "refreshed_at": datetime.now().isoformat(),
+    }
+    save_index_file(index_dir, "meta.json", lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    print(f"🧮 Vector index refreshed in {time.time() - start:.2f}s | Added: {added} | Live: {int(live.sum())}/{len(ids)}")
+
+def load_vector_index(index_dir=VECTOR_INDEX_DIR):
+    meta = read_meta(index_dir)
+    if not meta or not meta.get("count"):
+        return {"matrix": np.zeros((0, 0), dtype=np.float32), "ids": np.array([], dtype=str), "live": np.zeros(0, dtype=bool)}
+    matrix = np.memmap(
+        index_path(index_dir, "matrix.bin"),
+        dtype=meta["dtype"],
+        mode="r",
+        shape=(meta["count"], meta["dim"])
+    )
+    return {
+        "matrix": matrix,
+        "ids": np.load(index_path(index_dir, "ids.npy")),
+        "live": np.load(index_path(index_dir, "live.npy")),
+    }
+
+def live_rows(index):
+    # tender_id → matrix row of its current embedding, built on first use.
+    if "rows" not in index:
+        live = index["live"]
+        index["rows"] = {tid: i for i, tid in enumerate(index["ids"].tolist()) if live[i]}
+    return index["rows"]
+
+def search_vector_index(index, query_vecs, top_k, chunk_rows=VECTOR_INDEX_CHUNK_ROWS):
+    # Exact top-K cosine: stream the matrix in row blocks, keep the best K per
+    # query with argpartition, and report scores on Atlas' cosine scale
+    # ((1 + cos) / 2) so boosts are unchanged.
+    queries = normalize_rows(query_vecs)
+    matrix, live, ids = index["matrix"], index["live"], index["ids"]
+    n_queries = len(queries)
+
+    best_scores = np.empty((n_queries, 0), dtype=np.float32)
+    best_rows = np.empty((n_queries, 0), dtype=np.int64)
+    for start in range(0, len(ids), chunk_rows):
+        block = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+        sims = queries @ block.T
+        sims[:, ~live[start:start + len(block)]] = -np.inf
+
+        scores = np.concatenate([best_scores, sims], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(block)), sims.shape)], axis=1)
+        if scores.shape[1] > top_k:
+            keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+    results = []
+    for q_scores, q_rows in zip(best_scores.tolist(), best_rows.tolist()):
+        results.append([
+            {"tender_id": str(ids[row]), "score": (1 + score) / 2}
+            for score, row in zip(q_scores, q_rows)
+            if score != -np.inf
+        ])
+    return results
+
+def search_many(index, query_vecs, top_k, batch_size=VECTOR_QUERY_BATCH):
+    results = []
+    for i in range(0, len(query_vecs), batch_size):
+        results.extend(search_vector_index(index, query_vecs[i:i + batch_size], top_k))
+    return results